@@ -0,0 +1,311 @@
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+STATS_PATH = re.compile(r"^/repos/([^/]+)/([^/]+)/stats/(\w+)$")
+ALIASED_REPOSITORY = re.compile(r'(\w+)\s*:\s*repository\(owner:\s*("[^"]*"),\s*name:\s*("[^"]*")\)')
+PAGE_SIZE = re.compile(r"repositories\(first:\s*(\d+)")
+HISTORY_PAGE = re.compile(r'(\w+)\s*:\s*repository\(owner:\s*("[^"]*"),\s*name:\s*("[^"]*")\).*'
+                          r'history\(first:\s*(\d+)(?:,\s*after:\s*("[^"]*"))?')
+
+
+def digest(*parts):
+    """
+    Stable integer derived from parts, so every run serves the same data
+    """
+    return int(hashlib.md5("/".join(str(part) for part in parts).encode("utf-8")).hexdigest(), 16)
+
+
+def below_rate(rate, *parts):
+    return rate > 0 and digest(*parts) % 10000 < rate * 10000
+
+
+def repository_node(owner, name):
+    """
+    Repository as returned by the RepoFields fragment
+    """
+    h = digest(owner, name)
+    return {
+        "nameWithOwner": owner + "/" + name,
+        "name": name,
+        "descriptionHTML": "<div>Synthetic repository {0}</div>".format(name),
+        "homepageUrl": "",
+        "isPrivate": h % 29 == 0,
+        "repositoryTopics": {"edges": [{"node": {"topic": {"name": "topic-{0}".format(h % 7)}, "url": ""}}]},
+        "primaryLanguage": {"name": "Python", "color": "#3572A5"},
+        "languages": {"edges": [{"node": {"name": "Python"}, "size": 1000 + h % 5000},
+                                {"node": {"name": "Shell"}, "size": h % 300}]},
+        "pushedAt": "2020-10-30T12:00:00Z",
+        "updatedAt": "2020-10-30T12:00:00Z",
+        "forkCount": h % 40,
+        "stargazerCount": h % 500,
+        "stargazers": {"totalCount": h % 500},
+        "watchers": {"totalCount": h % 30},
+        "defaultBranchRef": {"target": {"oid": "{0:040x}".format(h % (1 << 160)),
+                                        "history": {"totalCount": 100 + h % 2000}}},
+        "pull_request": {"totalCount": h % 200},
+        "open_pull_request": {"totalCount": h % 10},
+        "merged_pull_request": {"totalCount": h % 150},
+        "closed_pull_request": {"totalCount": h % 20},
+        "issue": {"totalCount": h % 300},
+        "open_issue": {"totalCount": h % 40},
+        "closed_issue": {"totalCount": h % 250},
+    }
+
+
+def commit_author(owner, name, index):
+    """
+    Author of the commit index of the default branch, 0 being HEAD
+    The authors are the contributors of stats_payload
+    """
+    h = digest(owner, name)
+    return {"email": "", "user": {"login": "user-{0}".format((h + index % (1 + h % 12)) % 5000)}}
+
+
+def history_node(owner, name, first, after):
+    """
+    Default branch of a repository with a page of its history, newest first
+    """
+    h = digest(owner, name)
+    head = "{0:040x}".format(h % (1 << 160))
+    total = 100 + h % 2000
+    start = int(after) if after else 0
+    end = min(start + first, total)
+
+    def oid(index):
+        return head if index == 0 else "{0:040x}".format(digest(owner, name, "commit", index) % (1 << 160))
+
+    # A linear history, every commit having the next one as parent
+    commits = [{"oid": oid(index),
+                "parents": {"totalCount": 1 if index + 1 < total else 0,
+                            "nodes": [{"oid": oid(index + 1)}] if index + 1 < total else []},
+                "author": commit_author(owner, name, index)} for index in range(start, end)]
+    return {"defaultBranchRef": {"target": {"oid": head, "history": {
+        "pageInfo": {"hasNextPage": end < total, "endCursor": str(end)},
+        "nodes": commits,
+    }}}}
+
+
+def query_cost(query):
+    """
+    Rough GraphQL points of a query: the full fields of a repository and a
+    page of its history ask for several connections, a page of fingerprints
+    for a single one
+    """
+    if "...RepoFields" in query or "...AuthorPage" in query:
+        return max(1, len(ALIASED_REPOSITORY.findall(query)) // 5)
+    return 1
+
+
+def stats_payload(owner, name, endpoint):
+    h = digest(owner, name)
+    if endpoint == "contributors":
+        return [{"author": {"login": "user-{0}".format((h + i) % 5000)}, "total": i + 1, "weeks": []}
+                for i in range(1 + h % 12)]
+    if endpoint == "commit_activity":
+        return [{"total": (h + week) % 9, "week": week, "days": [0] * 7} for week in range(52)]
+    if endpoint == "code_frequency":
+        return [[week, (h + week) % 300, -((h + week) % 120)] for week in range(52)]
+    if endpoint == "participation":
+        return {"all": [(h + week) % 9 for week in range(52)], "owner": [(h + week) % 3 for week in range(52)]}
+    return None
+
+
+class MockGitHub(object):
+    """
+    Local stand-in for the GraphQL and REST endpoints used by fetch_projects.py
+
+    organizations maps each organization login to the names of its
+    repositories; individual repositories are served for any owner. The
+    latency is added to every response, error_rate of the attempts fail
+    with a 502 and pending_rate of the statistics are still being computed
+    (202) for their first pending_polls requests. Queries asking for more
+than timeout_above repositories fail the way GitHub does when a query
+runs for too long. Failures are derived from
+    the request itself, not drawn at random, so the request count of a
+    scenario does not change from one run to the other.
+    """
+
+    def __init__(self, organizations, latency=0.0, error_rate=0.0, pending_rate=0.0, pending_polls=2,
+                 members=12, timeout_above=None, host="127.0.0.1", port=0):
+        self.organizations = organizations
+        self.latency = latency
+        self.error_rate = error_rate
+        self.pending_rate = pending_rate
+        self.pending_polls = pending_polls
+        self.members = members
+        self.timeout_above = timeout_above
+        self._lock = threading.Lock()
+        self._attempts = {}
+        self.counts = {"graphql": 0, "rest": 0, "errors": 0, "pending": 0, "not_modified": 0, "timeouts": 0}
+        self.server = _ThreadingServer((host, port), _handler(self))
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self._attempts = {}
+            for key in self.counts:
+                self.counts[key] = 0
+
+    def attempt(self, key, kind):
+        """
+        Count a request and return how many times the same one was made before
+        """
+        with self._lock:
+            self.counts[kind] += 1
+            number = self._attempts.get(key, 0)
+            self._attempts[key] = number + 1
+            return number
+
+    def count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def organization_page(self, owner, first, after):
+        names = self.organizations.get(owner)
+        if names is None:
+            return {"data": {"organization": None},
+                    "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to an Organization"}]}
+        start = int(after) if after else 0
+        page = names[start:start + first]
+        end = start + len(page)
+        return {"data": {"organization": {
+            "repositories": {
+                "pageInfo": {"hasNextPage": end < len(names), "endCursor": str(end)},
+                "totalCount": len(names),
+                "edges": [{"node": repository_node(owner, name)} for name in page],
+                "nodes": [repository_node(owner, name) for name in page],
+            },
+            "membersWithRole": {"totalCount": self.members},
+        }}}
+
+    def graphql(self, query, variables):
+        match = PAGE_SIZE.search(query)
+        first = int(variables.get("first") or (match.group(1) if match else 100))
+        if self.timeout_above is not None:
+            asked = first if "organization(login" in query else len(ALIASED_REPOSITORY.findall(query))
+            if asked > self.timeout_above:
+                self.count("timeouts")
+                return {"data": None, "errors": [{"message": "Something went wrong while executing your query. "
+                                                             "This may be the result of a timeout."}]}
+        if "organization(login" in query:
+            response = self.organization_page(variables["owner"], first, variables.get("endCursor"))
+        elif "...AuthorPage" in query:
+            data = {}
+            for alias, owner, name, page_size, after in HISTORY_PAGE.findall(query):
+                data[alias] = history_node(json.loads(owner), json.loads(name), int(page_size),
+                                           json.loads(after) if after else None)
+            response = {"data": data}
+        else:
+            data, errors = {}, []
+            for alias, owner, name in ALIASED_REPOSITORY.findall(query):
+                owner, name = json.loads(owner), json.loads(name)
+                if name.startswith("missing"):
+                    data[alias] = None
+                    errors.append({"type": "NOT_FOUND", "path": [alias],
+                                   "message": "Could not resolve to a Repository"})
+                else:
+                    data[alias] = repository_node(owner, name)
+            response = {"data": data}
+            if errors:
+                response["errors"] = errors
+        if "rateLimit" in query:
+            response["data"]["rateLimit"] = {"cost": query_cost(query), "remaining": 5000,
+                                             "resetAt": time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                                                      time.gmtime(time.time() + 3600))}
+        return response
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _handler(mock):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            BaseHTTPRequestHandler.setup(self)
+            # Small responses would otherwise wait for the delayed ACK
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status, payload, resource):
+            body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+            headers = {
+                "Content-Type": "application/json",
+                "X-RateLimit-Limit": "5000",
+                "X-RateLimit-Remaining": "5000",
+                "X-RateLimit-Reset": str(int(time.time()) + 3600),
+                "X-RateLimit-Resource": resource,
+            }
+            if self.command == "GET" and status == 200:
+                headers["ETag"] = '"{0}"'.format(hashlib.md5(body).hexdigest())
+                if self.headers.get("If-None-Match") == headers["ETag"]:
+                    mock.count("not_modified")
+                    status, body = 304, b""
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def fail(self, resource):
+            mock.count("errors")
+            self.send(502, {"message": "Server Error"}, resource)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+            query = body["query"]
+            variables = body.get("variables") or {}
+            if isinstance(variables, str):
+                variables = json.loads(variables)
+            attempt = mock.attempt((query, json.dumps(variables, sort_keys=True)), "graphql")
+            time.sleep(mock.latency)
+            if below_rate(mock.error_rate, query, sorted(variables.items()), attempt):
+                return self.fail("graphql")
+            self.send(200, mock.graphql(query, variables), "graphql")
+
+        def do_GET(self):
+            match = STATS_PATH.match(self.path)
+            attempt = mock.attempt(self.path, "rest")
+            time.sleep(mock.latency)
+            if not match:
+                return self.send(404, {"message": "Not Found"}, "core")
+            if below_rate(mock.error_rate, self.path, attempt):
+                return self.fail("core")
+            owner, name, endpoint = match.groups()
+            if attempt < mock.pending_polls and below_rate(mock.pending_rate, self.path):
+                mock.count("pending")
+                return self.send(202, {}, "core")
+            payload = stats_payload(owner, name, endpoint)
+            if payload is None:
+                return self.send(404, {"message": "Not Found"}, "core")
+            self.send(200, payload, "core")
+
+    return Handler
@@ -0,0 +1,257 @@
+"""
+Benchmark fetch_projects.py offline against a local mock of the GitHub API
+
+Every scenario generates a synthetic lab with years of history, runs the
+fetch script in it and records, for every stage of the run, the wall
+time, the requests sent, the peak RSS and the files written. The results
+are compared with baseline.json and the script exits with 1 when a
+stage got slower, heavier or chattier than the tolerances allow.
+
+    python scripts/benchmark/run_benchmarks.py small medium
+    python scripts/benchmark/run_benchmarks.py large --latency 0.05 --error-rate 0.02
+    python scripts/benchmark/run_benchmarks.py medium --timeout-above 30
+    python scripts/benchmark/run_benchmarks.py medium --profile
+    python scripts/benchmark/run_benchmarks.py medium --nodes 4
+    python scripts/benchmark/run_benchmarks.py small medium --update-baseline
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import mock_github
+import synthetic
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCHMARK_DIR)
+SITE_ROOT = os.path.dirname(SCRIPTS_DIR)
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# A Sunday and the first of a month, so both the weekly and monthly reports run
+RUN_DATE = "2020-11-01"
+
+# Allowed growth over the baseline before a stage is reported as a regression
+TOLERANCES = {
+    "seconds": (1.5, 0.5),  # (ratio, absolute slack)
+    "peak_rss_kb": (1.25, 10240),
+    "requests": (1.0, 0),
+    "files": (1.0, 0),
+}
+
+
+def files_by_stage(root, stages, started):
+    """
+    Count the files modified during the run, by the stage they were written in
+    """
+    counts = dict((stage["name"], 0) for stage in stages)
+    for directory, _, files in os.walk(root):
+        for name in files:
+            mtime = os.path.getmtime(os.path.join(directory, name))
+            if mtime < started:
+                continue
+            for stage in stages:
+                if mtime <= stage["end"]:
+                    counts[stage["name"]] += 1
+                    break
+    return counts
+
+
+def combine_stages(reports):
+    """
+    One record of each stage run by every node of a multi-node run
+    """
+    stages = []
+    for stage in reports[0]:
+        records = [next(record for record in report if record["name"] == stage["name"]) for report in reports]
+        stages.append({
+            "name": stage["name"],
+            "end": max(record["end"] for record in records),
+            "seconds": max(record["seconds"] for record in records),
+            "requests": sum(record["requests"] for record in records),
+            "peak_rss_kb": max(record["peak_rss_kb"] for record in records),
+        })
+    return stages
+
+
+def run_nodes(root, env, nodes, work_dir, name):
+    """
+    Run the fetch of every shard as a node of its own, at the same time,
+    then merge their bundles; returns the records of the stages
+    """
+    script = os.path.join(SCRIPTS_DIR, "fetch_projects.py")
+    running = []
+    for index in range(nodes):
+        node_dir = os.path.join(root, ".cache", "node-{0}".format(index))
+        node_env = dict(env)
+        node_env.update({
+            "FETCH_STAGE_REPORT": os.path.join(work_dir, "{0}-node-{1}-stages.json".format(name, index)),
+            "FETCH_CACHE_DIR": os.path.join(node_dir, "github"),
+            "FETCH_SNAPSHOT_DB": os.path.join(node_dir, "snapshots.sqlite"),
+            "FETCH_STATE_DIR": os.path.join(node_dir, "pipeline"),
+            "FETCH_ARCHIVE_DIR": os.path.join(node_dir, "archive"),
+            "FETCH_RUN_REPORT": os.path.join(node_dir, "run_report.json"),
+        })
+        log = open(os.path.join(work_dir, "{0}-node-{1}.log".format(name, index)), "w+")
+        command = [sys.executable, script, "--shard", "{0}/{1}".format(index, nodes)]
+        running.append((subprocess.Popen(command, cwd=root, env=node_env, stdout=log, stderr=subprocess.STDOUT),
+                        log, node_env["FETCH_STAGE_REPORT"]))
+    reports = []
+    for process, log, report_path in running:
+        process.wait()
+        log.close()
+        if process.returncode != 0:
+            raise RuntimeError("fetch_projects.py failed on {0}, see {1}".format(name, log.name))
+        with open(report_path) as f:
+            reports.append(json.load(f)["stages"])
+
+    with open(os.path.join(work_dir, name + ".log"), "w+") as log:
+        process = subprocess.run([sys.executable, script, "merge"], cwd=root, env=env, stdout=log,
+                                 stderr=subprocess.STDOUT)
+    if process.returncode != 0:
+        raise RuntimeError("fetch_projects.py merge failed on {0}, see {1}".format(name, log.name))
+    with open(env["FETCH_STAGE_REPORT"]) as f:
+        return combine_stages(reports) + json.load(f)["stages"]
+
+
+def run_scenario(scenario, mock, work_dir, workers, profile=False, processes=None, nodes=None):
+    root = os.path.join(work_dir, scenario.name)
+    end = datetime.datetime.strptime(RUN_DATE, "%Y-%m-%d")
+    print("LOG: Generating", scenario.name, "with", scenario.repository_count, "repositories")
+    synthetic.generate(scenario, root, SITE_ROOT, end)
+
+    mock.organizations = scenario.repositories()
+    mock.reset_counts()
+    report_path = os.path.join(work_dir, scenario.name + "-stages.json")
+    env = dict(os.environ)
+    env.update({
+        "GITHUB_API_URL": mock.url,
+        "GH_USERNAME": "benchmark",
+        "OAUTH_TOKEN": "benchmark",
+        "FETCH_DATE": RUN_DATE,
+        "FETCH_STAGE_REPORT": report_path,
+        "FETCH_CACHE_DIR": os.path.join(root, ".cache", "github"),
+        "FETCH_HISTORY_DB": os.path.join(root, ".cache", "history.sqlite"),
+        "FETCH_SNAPSHOT_DB": os.path.join(root, ".cache", "snapshots.sqlite"),
+    })
+    if workers:
+        env["FETCH_MAX_WORKERS"] = str(workers)
+    if processes:
+        env["FETCH_PROCESSES"] = str(processes)
+
+    # Let the mtimes of the generated tree fall before the run
+    time.sleep(0.01)
+    started = time.time()
+    if nodes:
+        stages = run_nodes(root, env, nodes, work_dir, scenario.name)
+    else:
+        with open(os.path.join(work_dir, scenario.name + ".log"), "w+") as log:
+            command = [sys.executable, os.path.join(SCRIPTS_DIR, "fetch_projects.py")]
+            if profile:
+                command += ["--profile", os.path.join(work_dir, scenario.name + "-profile")]
+            process = subprocess.run(command, cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if process.returncode != 0:
+            raise RuntimeError("fetch_projects.py failed on {0}, see {1}".format(scenario.name, log.name))
+        with open(report_path) as f:
+            stages = json.load(f)["stages"]
+    elapsed = time.time() - started
+    files = files_by_stage(root, stages, started)
+    results = {"total": {"seconds": round(elapsed, 4), "requests": 0, "peak_rss_kb": 0, "files": 0}}
+    for stage in stages:
+        results[stage["name"]] = {
+            "seconds": stage["seconds"],
+            "requests": stage["requests"],
+            "peak_rss_kb": stage["peak_rss_kb"],
+            "files": files[stage["name"]],
+        }
+        results["total"]["requests"] += stage["requests"]
+        results["total"]["files"] += files[stage["name"]]
+        results["total"]["peak_rss_kb"] = max(results["total"]["peak_rss_kb"], stage["peak_rss_kb"])
+    results["server"] = dict(mock.counts)
+    return results
+
+
+def regressions(name, results, baseline):
+    found = []
+    for stage, measures in sorted(results.items()):
+        if stage == "server" or stage not in baseline:
+            continue
+        for measure, (ratio, slack) in sorted(TOLERANCES.items()):
+            expected = baseline[stage].get(measure)
+            if expected is not None and measures[measure] > expected * ratio + slack:
+                found.append("{0} {1} {2}: {3} > {4}".format(name, stage, measure, measures[measure], expected))
+    return found
+
+
+def print_results(name, results):
+    print()
+    print("{0:<10} {1:>10} {2:>9} {3:>12} {4:>7}".format(name, "seconds", "requests", "peak RSS kB", "files"))
+    for stage, measures in results.items():
+        if stage == "server":
+            continue
+        print("{0:<10} {seconds:>10.3f} {requests:>9} {peak_rss_kb:>12} {files:>7}".format(stage, **measures))
+    print("server    ", ", ".join("{0}={1}".format(key, value) for key, value in sorted(results["server"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch_projects.py against a mock GitHub API")
+    parser.add_argument("scenarios", nargs="*", default=["small", "medium"], choices=sorted(synthetic.SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests failing with 502")
+    parser.add_argument("--pending-rate", type=float, default=0.0,
+                        help="share of the statistics answered with 202 first")
+    parser.add_argument("--timeout-above", type=int,
+                        help="queries asking for more repositories than this time out")
+    parser.add_argument("--workers", type=int, help="FETCH_MAX_WORKERS of the runs")
+    parser.add_argument("--processes", type=int, help="FETCH_PROCESSES of the runs")
+    parser.add_argument("--nodes", type=int,
+                        help="run the fetch as this many shards at the same time, each with its own "
+                             "state like separate machines, then merge their bundles")
+    parser.add_argument("--work-dir", help="where the synthetic trees are generated, a temporary directory by default")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every stage into the work directory, the results are not compared")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="fetch-benchmark-")
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    mock = mock_github.MockGitHub({}, latency=args.latency, error_rate=args.error_rate,
+                                  pending_rate=args.pending_rate, timeout_above=args.timeout_above).start()
+    found = []
+    try:
+        for name in args.scenarios:
+            results = run_scenario(synthetic.SCENARIOS[name], mock, work_dir, args.workers, args.profile,
+                                   args.processes, args.nodes)
+            print_results(name, results)
+            if args.profile:
+                print("LOG: Profiles of", name, "in", os.path.join(work_dir, name + "-profile"))
+            elif args.update_baseline:
+                baseline[name] = results
+            elif name in baseline:
+                found.extend(regressions(name, results, baseline[name]))
+    finally:
+        mock.stop()
+
+    print()
+    print("LOG: Working trees and logs in", work_dir)
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w+") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("LOG: Baseline updated")
+        return 0
+    for regression in found:
+        print("REGRESSION:", regression)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
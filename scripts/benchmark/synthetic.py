@@ -0,0 +1,118 @@
+import datetime
+import json
+import os
+import shutil
+
+from mock_github import digest
+
+# Repositories tracked one by one belong to this owner
+INDIVIDUAL_OWNER = "solo"
+
+METRIC_KEYS = [
+    "commitCount", "issueCount", "openIssueCount", "closedIssueCount", "pullRequestCount",
+    "openPullRequestCount", "mergedPullRequestCount", "closedPullRequestCount",
+    "forkCount", "starCount", "watcherCount",
+]
+
+
+class Scenario(object):
+    """
+    Size of a synthetic lab: organizations fetched with all their
+    repositories, repositories listed one by one and years of history
+    """
+
+    def __init__(self, name, organizations, repos_per_org, individual_repos, years):
+        self.name = name
+        self.organizations = ["org-{0:03d}".format(i) for i in range(organizations)]
+        self.repos_per_org = repos_per_org
+        self.individual_repos = ["repo-{0:05d}".format(i) for i in range(individual_repos)]
+        self.years = years
+
+    @property
+    def repository_count(self):
+        return len(self.organizations) * self.repos_per_org + len(self.individual_repos)
+
+    def repositories(self):
+        """
+        Organization login -> names of its repositories, as served by the mock API
+        """
+        return {org: ["repo-{0:05d}".format(i) for i in range(self.repos_per_org)]
+                for org in self.organizations}
+
+
+SCENARIOS = {
+    "small": Scenario("small", 1, 8, 2, years=3),
+    "medium": Scenario("medium", 9, 110, 10, years=3),
+    "large": Scenario("large", 40, 495, 200, years=2),
+}
+
+
+def history_dates(end, years):
+    """
+    Sundays and first days of the month of the years before end
+    """
+    start = end - datetime.timedelta(days=365 * years)
+    weekly, monthly = [], []
+    day = start
+    while day < end:
+        if day.weekday() == 6:
+            weekly.append(day.strftime("%Y-%m-%d"))
+        if day.day == 1:
+            monthly.append(day.strftime("%Y-%m-%d"))
+        day += datetime.timedelta(days=1)
+    return weekly, monthly
+
+
+def history(key, dates):
+    """
+    Snapshots of a series growing a little every period
+    """
+    h = digest(key)
+    snapshots = {}
+    previous_date = dates[0] if dates else None
+    for index, date in enumerate(dates):
+        snapshot = {"current_date": date, "previous_date": previous_date}
+        for offset, metric in enumerate(METRIC_KEYS):
+            snapshot[metric] = (h >> offset) % 50 + index * ((h >> (offset + 11)) % 3)
+        snapshots[date] = snapshot
+        previous_date = date
+    return snapshots
+
+
+def write_series(data_dir, series, snapshots):
+    with open(os.path.join(data_dir, series + ".json"), "w+") as f:
+        json.dump(snapshots, f)
+
+
+def generate(scenario, root, site_root, end):
+    """
+    Create the working tree of a scenario in root: the lists of repositories,
+    the SVG template copied from site_root and the history before end
+    """
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    data_dir = os.path.join(root, "_data")
+    os.makedirs(data_dir)
+    os.makedirs(os.path.join(root, "assets"))
+    os.makedirs(os.path.join(root, "metrics"))
+    shutil.copy(os.path.join(site_root, "assets", "network_raw.svg"), os.path.join(root, "assets"))
+
+    with open(os.path.join(root, "repos-to-include.txt"), "w+") as f:
+        for org in scenario.organizations:
+            f.write(org + "/*\n")
+        for name in scenario.individual_repos:
+            f.write(INDIVIDUAL_OWNER + "/" + name + "\n")
+    with open(os.path.join(root, "repos-to-exclude.txt"), "w+") as f:
+        if scenario.organizations:
+            f.write(scenario.organizations[0] + "/repo-00000\n")
+
+    weekly, monthly = history_dates(end, scenario.years)
+    owners = list(scenario.repositories().items())
+    if scenario.individual_repos:
+        owners.append((INDIVIDUAL_OWNER, scenario.individual_repos))
+    for owner, names in owners:
+        for period, dates in (("weekly", weekly), ("monthly", monthly)):
+            write_series(data_dir, owner + "_" + period, history(owner + period, dates))
+            for name in names:
+                series = owner + "__" + name + "_" + period
+                write_series(data_dir, series, history(series, dates))
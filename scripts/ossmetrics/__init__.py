@@ -0,0 +1,8 @@
+"""
+Metrics of the open source repositories of the lab
+
+The pipeline runs in stages: plan reads the repositories to track, fetch
+gets them from GitHub, normalize flattens the responses, aggregate sums
+them by organization, persist saves the data and the history, and render
+generates the metrics pages. See pipeline.Pipeline and cli.
+"""
@@ -0,0 +1,85 @@
+from .records import METRIC_KEYS
+from .sketch import UniqueSketch
+
+# Unique contributors of an organization, added to its summed metrics
+CONTRIBUTORS_KEY = "contributorCount"
+
+
+def group_by_owner(data_json):
+    """
+    Group the repositories by owner in one pass, in order of appearance
+    """
+    repos_by_owner = {}
+    for repo in data_json:
+        owner = repo.split("/")[0]
+        repos_by_owner.setdefault(owner, []).append(repo)
+    return repos_by_owner
+
+
+def aggregate(repositories, orgs, members=None, stored_sketch=None):
+    """
+    Figures of the whole lab and of each organization, in one pass over
+    the (full name, RepoSnapshot) pairs of the repositories
+    Returns the statistics summary, the categories listing the repositories
+    of every tracked organization, the summed metrics of every owner and
+    the members count shown in the network picture
+
+    The contributors of the lab and of every owner are counted once each by
+    merging the sketches of the repositories. stored_sketch(full name), if
+    given, returns the stored sketch of a repository which has none, e.g.
+    when the repositories are read from projects.json; the contributors of
+    a repository without any are added as they are.
+    """
+    # Statistics Summary
+    count = 0
+    commits = 0
+    # Names of the repositories of each owner and the summed metrics of each organization
+    names_by_owner = {}
+    totals_by_owner = {}
+    # Merged sketch and contributors of the repositories without one, of the lab and of each owner
+    lab_contributors = [UniqueSketch(), 0]
+    contributors_by_owner = {}
+    for repo, snapshot in repositories:
+        count += 1
+        commits = commits + snapshot.commits
+
+        owner = repo.split("/")[0]
+        names_by_owner.setdefault(owner, []).append(snapshot.name)
+        totals = totals_by_owner.get(owner)
+        values = snapshot.metric_values()
+        totals_by_owner[owner] = list(values) if totals is None else [a + b for a, b in zip(totals, values)]
+
+        owner_contributors = contributors_by_owner.setdefault(owner, [UniqueSketch(), 0])
+        encoded = snapshot.contributor_sketch
+        if encoded is None and stored_sketch is not None:
+            encoded = stored_sketch(repo)
+        if encoded is None:
+            lab_contributors[1] += snapshot.contributors or 0
+            owner_contributors[1] += snapshot.contributors or 0
+        else:
+            sketch = UniqueSketch.decode(encoded)
+            lab_contributors[0].merge(sketch)
+            owner_contributors[0].merge(sketch)
+
+    statistics = {
+        "repositories": count,
+        "commits": commits,
+        "contributors": lab_contributors[0].count() + lab_contributors[1]
+    }
+    organization_metrics = {}
+    for owner, totals in totals_by_owner.items():
+        metrics = dict(zip(METRIC_KEYS, totals))
+        sketch, unsketched = contributors_by_owner[owner]
+        metrics[CONTRIBUTORS_KEY] = sketch.count() + unsketched
+        organization_metrics[owner] = metrics
+
+    categories = []
+    for cate in orgs:
+        categories.append({cate: names_by_owner.get(cate, [])})
+
+    return {
+        "statistics": statistics,
+        "categories": categories,
+        "organization_metrics": organization_metrics,
+        "members": members,
+    }
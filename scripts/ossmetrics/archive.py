@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from . import normalize
+from . import spool
+from . import stats_jobs
+from .plan import Plan
+
+
+class ResponseArchive(object):
+    """
+    Compressed, content-addressed store of the raw data fetched from GitHub
+
+    Every raw repository node and statistics payload is stored once, as
+    gzipped JSON named by the SHA-256 of its compact form, so what did not
+    change from one run to the next costs nothing more. Each run has a
+    manifest, runs/DATE.jsonl, listing what it fetched in order and the
+    object of each repository and payload, from which the outputs of the
+    day can be generated again without GitHub.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.runs_dir = os.path.join(directory, "runs")
+        for path in (self.objects_dir, self.runs_dir):
+            if not os.path.exists(path):
+                os.makedirs(path, exist_ok=True)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest + ".json.gz")
+
+    def put(self, payload):
+        """
+        Store a payload unless already there, returns its digest
+        """
+        # Keys keep the order of GitHub, which the published files follow
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        file_path = self._object_path(digest)
+        if os.path.exists(file_path):
+            return digest
+        directory = os.path.dirname(file_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # Written aside and renamed, so an object is never seen half written
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(data))
+        os.replace(temp_path, file_path)
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self._object_path(digest), "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+
+    def run_path(self, date_str, shard=None):
+        """
+        Manifest of the run of a day, or of one shard (index, count) of it
+        """
+        if shard is None:
+            return os.path.join(self.runs_dir, date_str + ".jsonl")
+        return os.path.join(self.runs_dir, "{0}.shard-{1}-of-{2}.jsonl".format(date_str, *shard))
+
+    def dates(self):
+        """
+        Days with an archived run, in order
+        """
+        return sorted(name[:-len(".jsonl")] for name in os.listdir(self.runs_dir)
+                      if name.endswith(".jsonl") and ".shard-" not in name)
+
+
+class RunManifest(object):
+    """
+    Manifest of the run of a day, appended by the fetching threads
+
+    A new run replaces the manifest of the same day, a resumed run adds
+    to it. Its first line is the plan of the run and its last line, once
+    the fetch completed, the order of the sources and the members count.
+    Each shard of a sharded fetch has its own manifest, merged into the
+    one of the day by merge_shards. A node of a multi-node run archives
+    only its share, which goes with its bundle to the archive of the
+    merge, see bundles.py.
+    """
+
+    def __init__(self, archive, date_str, plan_key, resume=False, shard=None):
+        self.archive = archive
+        self._lock = threading.Lock()
+        file_path = archive.run_path(date_str, shard)
+        resume = resume and os.path.exists(file_path)
+        self._file = open(file_path, "a" if resume else "w+")
+        if not resume:
+            self.record({"plan": plan_key})
+
+    def record(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def source(self, source, repositories):
+        """
+        The repositories of a spool source, as (full name, digest) pairs in order
+        """
+        self.record({"source": source, "repositories": repositories})
+
+    def stats(self, repo, endpoint, payload):
+        self.record({"repo": repo, "endpoint": endpoint, "payload": self.archive.put(payload)})
+
+    def complete(self, sources, members):
+        self.record({"sources": sources, "members": members})
+
+    def close(self):
+        self._file.close()
+
+
+def run_key(plan_key, node_shard=None):
+    """
+    Plan key of a manifest, which tells the share of a node of a multi-node
+    run apart from a whole run
+    """
+    return plan_key if node_shard is None else dict(plan_key, node_shard=list(node_shard))
+
+
+def merge_shards(archive, date_str, plan_key, count, sources, members):
+    """
+    Write the manifest of the day from those of its count shards, which are
+    kept so a resumed run merges them again
+    """
+    with open(archive.run_path(date_str), "w+") as f:
+        f.write(json.dumps({"plan": plan_key}) + "\n")
+        for index in range(count):
+            with open(archive.run_path(date_str, (index, count))) as shard_file:
+                for line in shard_file:
+                    entry = json.loads(line)
+                    if "source" in entry or "endpoint" in entry:
+                        f.write(line)
+        f.write(json.dumps({"sources": sources, "members": members}) + "\n")
+
+
+def write_run(archive, date_str, plan_key, repositories, stats, sources, members):
+    """
+    Write the manifest of the day from the repositories {source: [(full
+    name, digest)]} and the digests of the statistics {repo: {endpoint:
+    digest}} of a run fetched elsewhere, as those of the nodes of a
+    multi-node run
+    """
+    manifest = RunManifest(archive, date_str, plan_key)
+    try:
+        for source in sources:
+            manifest.source(source, repositories.get(source, []))
+        for repo in sorted(stats):
+            for endpoint, digest in sorted(stats[repo].items()):
+                manifest.record({"repo": repo, "endpoint": endpoint, "payload": digest})
+        manifest.complete(sources, members)
+    finally:
+        manifest.close()
+
+
+def read_run(archive, date_str):
+    """
+    Returns the plan key, the last repositories of every source, the
+    digests of the statistics {repo: {endpoint: digest}} and the closing
+    entry of the run of a day
+    """
+    file_path = archive.run_path(date_str)
+    if not os.path.exists(file_path):
+        raise Exception("No archived run for {0} in {1}".format(date_str, archive.directory))
+    plan_key = None
+    sources = {}
+    stats = {}
+    completion = None
+    with open(file_path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if "plan" in entry:
+                plan_key = entry["plan"]
+            elif "source" in entry:
+                sources[entry["source"]] = entry["repositories"]
+            elif "endpoint" in entry:
+                stats.setdefault(entry["repo"], {})[entry["endpoint"]] = entry["payload"]
+            else:
+                completion = entry
+    if completion is None:
+        raise Exception("The run of {0} did not complete, it cannot be rebuilt".format(date_str))
+    return plan_key, sources, stats, completion
+
+
+def rebuild(config, archive):
+    """
+    Normalize again the repositories and statistics archived on the day of
+    config, without GitHub, into the spool
+    Returns the plan of that run and the same data as the fetch stage
+    """
+    plan_key, sources, stats, completion = read_run(archive, config.date_str)
+    if "node_shard" in plan_key:
+        raise Exception("The archived run of {0} is the share of node {1}/{2} only, rebuild it from the "
+                        "archive of the merge".format(config.date_str, *plan_key["node_shard"]))
+    spool_writer = spool.SpoolWriter(config.spool_dir)
+    try:
+        for source in completion["sources"]:
+            rows = []
+            for name, digest in sources.get(source, []):
+                if digest is None:
+                    print("LOG: No archived data for", name)
+                    continue
+                rows.append(normalize.normalize_repository(archive.get(digest)).to_row())
+            spool_writer.put(source, rows)
+    finally:
+        spool_writer.close()
+
+    summaries = {}
+    for repo, digests in stats.items():
+        summaries[repo] = stats_jobs.merge_summaries(
+            [stats_jobs.summarize_endpoint(endpoint, archive.get(digest)) for endpoint, digest in digests.items()])
+    print("LOG: Rebuilt", config.date_str, "from the archive:", sum(len(sources.get(source, []))
+                                                                     for source in completion["sources"]),
+          "repositories")
+
+    return Plan.from_key(plan_key), {"members": completion["members"], "sources": completion["sources"], "stats": summaries}
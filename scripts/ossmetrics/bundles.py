@@ -0,0 +1,276 @@
+import bisect
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from . import archive
+from . import instrument
+from . import spool
+from .plan import Plan
+
+# Points of every shard on the hash ring, so the repositories spread evenly
+REPLICAS = 64
+BUNDLE_FILE = "bundle.json"
+# Spool file of a page of an organization, see fetch.page_source
+ORG_PAGE_SOURCE = re.compile(r"^(\d{4}-.+)-\d{4}\.jsonl$")
+
+
+def _hash(value):
+    return int(hashlib.sha1(value.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """
+    Consistent hashing of the full names of the repositories to count shards
+
+    A repository belongs to the shard of the first point of the ring after
+    the hash of its full name. The hash does not depend on the process, so
+    every node of a run agrees on the owner of every repository, and
+    changing the number of shards moves only a share of them.
+    """
+
+    def __init__(self, count, replicas=REPLICAS):
+        self.count = count
+        points = sorted((_hash("{0}-{1}".format(shard, replica)), shard)
+                        for shard in range(count) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_of(self, name):
+        index = bisect.bisect(self._hashes, _hash(name)) % len(self._hashes)
+        return self._shards[index]
+
+    def owns(self, shard):
+        """
+        Returns a function telling whether shard owns a full name
+        """
+        return lambda name: self.shard_of(name) == shard
+
+
+def parse_shard(value):
+    """
+    (index, count) of a shard given as i/N, e.g. 0/4
+    """
+    try:
+        index, count = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise Exception("Expected a shard as i/N, e.g. 0/4, got " + value)
+    if count < 1 or not 0 <= index < count:
+        raise Exception("Shard {0} out of range, i goes from 0 to N - 1".format(value))
+    return index, count
+
+
+def bundle_path(bundle_dir, shard):
+    return os.path.join(bundle_dir, "shard-{0}-of-{1}".format(*shard))
+
+
+def write_bundle(config, plan, fetched):
+    """
+    Write the output of the fetch of one shard to its bundle in config.bundle_dir
+
+    A bundle is self-contained: bundle.json holds the plan, the shard, the
+    members counts, the statistics and the order of the repositories of
+    every source, and spool/ the normalized repositories of the shard.
+    With an archive, archive/ holds the raw data of the shard and
+    bundle.json their digests, so the merge archives the whole run. A
+    shard run again replaces its bundle whole.
+    """
+    directory = bundle_path(config.bundle_dir, config.node_shard)
+    temp_dir = directory + ".tmp"
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(os.path.join(temp_dir, "spool"))
+    for source in fetched["sources"]:
+        file_path = os.path.join(config.spool_dir, source)
+        if os.path.exists(file_path):
+            shutil.copyfile(file_path, os.path.join(temp_dir, "spool", source))
+    bundle = {
+        "plan": plan.key(config.date_str),
+        "shard": list(config.node_shard),
+        "members": fetched["members"],
+        "org_members": fetched["org_members"],
+        "sources": fetched["sources"],
+        "order": fetched["order"],
+        "stats": fetched["stats"],
+    }
+    if config.archive_dir:
+        bundle["archive"] = _bundle_archive(config, temp_dir)
+    with open(os.path.join(temp_dir, BUNDLE_FILE), "w+") as f:
+        json.dump(bundle, f)
+        instrument.file_written("bundle", f.tell())
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.rename(temp_dir, directory)
+    print("LOG: Bundle of shard {0}/{1} saved to {2}".format(config.node_shard[0], config.node_shard[1], directory))
+
+
+def _bundle_archive(config, directory):
+    """
+    Copy the raw data the node archived for its shard to the archive/ of
+    its bundle, returns their digests
+    """
+    node_archive = archive.ResponseArchive(config.archive_dir)
+    _, repositories, stats, _ = archive.read_run(node_archive, config.date_str)
+    bundle_archive = archive.ResponseArchive(os.path.join(directory, "archive"))
+    digests = set(digest for pairs in repositories.values() for _, digest in pairs if digest is not None)
+    digests.update(digest for endpoints in stats.values() for digest in endpoints.values())
+    for digest in sorted(digests):
+        bundle_archive.put(node_archive.get(digest))
+    return {"repositories": repositories, "stats": stats}
+
+
+def find_bundles(bundle_dir):
+    """
+    Bundles in bundle_dir, those being written left out
+    """
+    if not os.path.exists(bundle_dir):
+        return []
+    return [os.path.join(bundle_dir, name) for name in sorted(os.listdir(bundle_dir))
+            if os.path.exists(os.path.join(bundle_dir, name, BUNDLE_FILE)) and not name.endswith(".tmp")]
+
+
+def run_date(directories):
+    """
+    Day of the run of the bundles, as YYYY-MM-DD
+    """
+    if not directories:
+        raise Exception("No bundle to merge")
+    with open(os.path.join(directories[0], BUNDLE_FILE)) as f:
+        return json.load(f)["plan"]["date"]
+
+
+def read_bundles(directories):
+    """
+    Returns the bundles of the shards of one run, by shard index
+    """
+    bundles = {}
+    for directory in directories:
+        with open(os.path.join(directory, BUNDLE_FILE)) as f:
+            bundle = json.load(f)
+        instrument.FILES_READ.inc(kind="bundle")
+        bundle["directory"] = directory
+        index, count = bundle["shard"]
+        if index in bundles:
+            raise Exception("Shard {0}/{1} given twice: {2} and {3}".format(
+                index, count, bundles[index]["directory"], directory))
+        bundles[index] = bundle
+    if not bundles:
+        raise Exception("No bundle to merge")
+    first = bundles[min(bundles)]
+    for bundle in bundles.values():
+        if bundle["plan"] != first["plan"] or bundle["shard"][1] != first["shard"][1]:
+            raise Exception("{0} and {1} are not shards of the same run".format(
+                first["directory"], bundle["directory"]))
+    missing = sorted(set(range(first["shard"][1])) - set(bundles))
+    if missing:
+        raise Exception("Missing the bundles of the shards " + ", ".join(str(index) for index in missing))
+    return bundles
+
+
+def merged_source(source):
+    """
+    Spool file of the merge taking the rows of a source: one per
+    organization for all its pages, whose size differs from node to node
+    """
+    match = ORG_PAGE_SOURCE.match(source)
+    return match.group(1) + ".jsonl" if match else source
+
+
+def _read_rows(file_path):
+    rows = {}
+    if os.path.exists(file_path):
+        instrument.FILES_READ.inc(kind="bundle")
+        with open(file_path) as f:
+            for line in f:
+                row = json.loads(line)
+                rows[row[0]] = row
+    return rows
+
+
+def merge(config, directories):
+    """
+    Combine the bundles of every shard of a run into the spool of config
+
+    The result only depends on the content of the bundles, not on their
+    order, and merging again gives the same spool. The sources follow the
+    plan, and the repositories of an organization follow its listing in
+    the lowest shard, all its pages in turn, as in a single run; the
+    pages themselves are not merged one by one since every node sizes
+    them its own way.
+    With config.archive_dir, the raw data of the bundles is archived as
+    the run of the day, which rebuild reads as that of a single run.
+    Returns the plan of the run and the same data as the fetch stage.
+    """
+    bundles = read_bundles(directories)
+    shards = [bundles[index] for index in sorted(bundles)]
+    plan_key = shards[0]["plan"]
+    if plan_key["date"] != config.date_str:
+        raise Exception("The bundles are of {0}, not of {1}".format(plan_key["date"], config.date_str))
+
+    # Merged source -> sources of the shards, pages in order
+    groups = {}
+    for source in sorted(set(source for bundle in shards for source in bundle["sources"])):
+        groups.setdefault(merged_source(source), []).append(source)
+    sources = sorted(groups)
+    spool_writer = spool.SpoolWriter(config.spool_dir)
+    merged_names = {}
+    try:
+        for source in sources:
+            rows = {}
+            position = {}
+            for bundle in shards:
+                for page in groups[source]:
+                    for name, row in _read_rows(os.path.join(bundle["directory"], "spool", page)).items():
+                        rows.setdefault(name, row)
+                    for name in bundle["order"].get(page, []):
+                        position.setdefault(name, len(position))
+            names = sorted(rows, key=lambda name: (position.get(name, len(position)), name))
+            spool_writer.put(source, [rows[name] for name in names])
+            merged_names[source] = names
+    finally:
+        spool_writer.close()
+
+    stats = {}
+    org_members = {}
+    for bundle in shards:
+        for repo, summary in bundle["stats"].items():
+            stats.setdefault(repo, summary)
+        for org, members in bundle["org_members"].items():
+            org_members.setdefault(org, members)
+    members = None
+    for org in plan_key["orgs"]:
+        if org_members.get(org):
+            members = org_members[org]
+    if config.archive_dir:
+        _merge_archives(config, shards, plan_key, merged_names, members)
+    print("LOG: Merged", len(shards), "shards:", sum(len(names) for names in merged_names.values()),
+          "repositories")
+    return Plan.from_key(plan_key), {"members": members, "org_members": org_members, "sources": sources,
+                                     "stats": stats}
+
+
+def _merge_archives(config, shards, plan_key, merged_names, members):
+    """
+    Archive the run of the day from the raw data in the bundles, the
+    repositories of every merged source in their merged order
+    """
+    if any("archive" not in bundle for bundle in shards):
+        print("LOG: A shard was fetched without an archive, the run of", config.date_str, "is not archived")
+        return
+    merged = archive.ResponseArchive(config.archive_dir)
+    digests = {}
+    stats = {}
+    for bundle in shards:
+        share = archive.ResponseArchive(os.path.join(bundle["directory"], "archive"))
+        for pairs in bundle["archive"]["repositories"].values():
+            for name, digest in pairs:
+                if digest is not None and name not in digests:
+                    digests[name] = merged.put(share.get(digest))
+        for repo, endpoints in bundle["archive"]["stats"].items():
+            if repo not in stats:
+                stats[repo] = dict((endpoint, merged.put(share.get(digest))) for endpoint, digest in endpoints.items())
+    repositories = dict((source, [(name, digests.get(name)) for name in names])
+                        for source, names in merged_names.items())
+    archive.write_run(merged, config.date_str, plan_key, repositories, stats, sorted(merged_names), members)
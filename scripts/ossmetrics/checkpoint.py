@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import uuid
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+
+def checkpoint_file(shard=None):
+    """
+    Checkpoint of the whole fetch, or of one shard (index, count) of it
+    """
+    if shard is None:
+        return CHECKPOINT_FILE
+    return "checkpoint-{0}-of-{1}.jsonl".format(*shard)
+
+
+class Checkpoint(object):
+    """
+    Log of the units of work a fetch completed, to resume it after a failure
+
+    The first line identifies the run: its ID and what it fetches, the day
+    and the plan. Every following line is a completed unit, appended and
+    flushed as soon as it is done: a page of an organization with the
+    cursor after it, a batch of individual repositories, or the summary of
+    one statistics endpoint of a repository. The records of the pages and
+    batches are in the spool next to the checkpoint. Only the units of the
+    resumed run are kept in memory.
+    """
+
+    def __init__(self, path, run_id, key, units=()):
+        self.path = path
+        self.run_id = run_id
+        self.key = key
+        self.units = list(units)
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    @classmethod
+    def start(cls, directory, key, file_name=CHECKPOINT_FILE):
+        path = os.path.join(directory, file_name)
+        run_id = uuid.uuid4().hex[:12]
+        with open(path, "w+") as f:
+            f.write(json.dumps({"run_id": run_id, "key": key}) + "\n")
+        print("LOG: Fetch run", run_id)
+        return cls(path, run_id, key)
+
+    @classmethod
+    def resume(cls, directory, key, file_name=CHECKPOINT_FILE):
+        """
+        Continue the run of the checkpoint in directory if it fetches the
+        same thing, or else start a new one
+        """
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            print("LOG: No fetch run to resume")
+            return None
+        with open(path) as f:
+            lines = f.readlines()
+        header = json.loads(lines[0])
+        if header["key"] != key:
+            print("LOG: Fetch run", header["run_id"], "was for another day or plan, not resuming it")
+            return None
+        units = []
+        for line in lines[1:]:
+            try:
+                units.append(json.loads(line))
+            except ValueError:
+                # The line being written when the run stopped
+                break
+        # Rewritten without that line, so the units of this run start on their own line
+        with open(path, "w+") as f:
+            f.writelines(line.rstrip("\n") + "\n" for line in lines[:1 + len(units)])
+        print("LOG: Resuming fetch run", header["run_id"], "with", len(units), "units done")
+        return cls(path, header["run_id"], key, units)
+
+    def record(self, unit):
+        line = json.dumps(unit) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def org_pages(self, org):
+        """
+        Pages of the organization completed in a row from the first one
+        """
+        pages = dict((unit["page"], unit) for unit in self.units
+                     if unit["unit"] == "page" and unit["org"] == org)
+        done = []
+        while len(done) in pages:
+            done.append(pages[len(done)])
+        return done
+
+    def batches(self):
+        return dict((unit["source"], unit) for unit in self.units if unit["unit"] == "batch")
+
+    def stats(self):
+        """
+        Summaries of the statistics already collected, {repo: {endpoint: summary}}
+        """
+        done = {}
+        for unit in self.units:
+            if unit["unit"] == "stats":
+                done.setdefault(unit["repo"], {})[unit["endpoint"]] = unit["summary"]
+        return done
+
+    def close(self):
+        self._file.close()
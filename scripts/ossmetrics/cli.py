@@ -0,0 +1,99 @@
+import argparse
+import datetime
+
+from . import bundles
+from .config import Config
+from .pipeline import MERGE_STAGES, REBUILD_STAGES, SHARD_STAGES, STAGES, Pipeline
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fetch the repositories of the lab from GitHub and generate the metrics pages. "
+                    "The stages run in order, by default all of them. 'rebuild' alone generates "
+                    "again the outputs of the archived runs, of every day or of --date, offline. "
+                    "With --shard i/N, a node of a multi-node run fetches its share of the "
+                    "repositories into a bundle, and 'merge' alone generates the outputs from the "
+                    "bundles of all the nodes.")
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help="stages to run among " + ", ".join(STAGES) + ", or rebuild, or merge")
+    parser.add_argument("--date", help="day of the run as YYYY-MM-DD, today by default")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="profile the CPU and memory of each stage, and write the profiles to DIR")
+    parser.add_argument("--processes", type=int, metavar="N",
+                        help="fetch the organizations in N processes, FETCH_PROCESSES or 1 by default")
+    parser.add_argument("--shard", metavar="i/N",
+                        help="fetch only the repositories of shard i of N, by a hash of their full name, "
+                             "into a bundle")
+    parser.add_argument("--bundle-dir", metavar="DIR",
+                        help="where the shards write their bundles and merge reads them, "
+                             "FETCH_BUNDLE_DIR or .cache/bundles by default")
+    parser.add_argument("--archive-dir", metavar="DIR",
+                        help="where the raw responses of every run are archived and rebuild reads them, "
+                             "FETCH_ARCHIVE_DIR or .cache/archive by default; it must outlive the runs, "
+                             "e.g. in the CI cache, for rebuild to find the earlier days")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the fetch of the last run of the same day from its checkpoint")
+    parser.add_argument("--prune-pages", action="store_true",
+                        help="delete the generated metrics pages of the repositories no longer tracked, "
+                             "kept by default since a repository may only be missing from one run")
+    args = parser.parse_args(argv)
+    for command in ("rebuild", "merge"):
+        if command in args.stages and len(args.stages) > 1:
+            parser.error(command + " runs on its own")
+    for stage in args.stages:
+        if stage not in STAGES and stage not in ("rebuild", "merge"):
+            parser.error("unknown stage {0}, choose among {1}".format(stage, ", ".join(STAGES)))
+    if args.shard:
+        try:
+            args.shard = bundles.parse_shard(args.shard)
+        except Exception as e:
+            parser.error(str(e))
+        if any(stage not in SHARD_STAGES for stage in args.stages):
+            parser.error("a shard only runs the stages " + ", ".join(SHARD_STAGES) + ", merge the bundles after")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = Config.from_env()
+    if args.date:
+        config.date = datetime.datetime.strptime(args.date, "%Y-%m-%d")
+    config.resume = args.resume
+    config.prune_pages = args.prune_pages
+    if args.processes:
+        config.processes = args.processes
+    if args.profile:
+        config.profile_dir = args.profile
+    if args.bundle_dir:
+        config.bundle_dir = args.bundle_dir
+    if args.archive_dir:
+        config.archive_dir = args.archive_dir
+    config.node_shard = args.shard
+
+    print("LOG: Assuming the current path to be the root of the metrics repository.")
+    if args.stages == ["rebuild"]:
+        rebuild(config, all_days=not args.date)
+    elif args.stages == ["merge"]:
+        if not args.date:
+            config.date = datetime.datetime.strptime(
+                bundles.run_date(bundles.find_bundles(config.bundle_dir)), "%Y-%m-%d")
+        Pipeline(config).run(MERGE_STAGES)
+    elif args.shard:
+        Pipeline(config).run(args.stages or SHARD_STAGES)
+    else:
+        Pipeline(config).run(args.stages or STAGES)
+    return 0
+
+
+def rebuild(config, all_days):
+    """
+    Generate the outputs of the archived runs again, in order of their day
+    """
+    from .archive import ResponseArchive
+    dates = ResponseArchive(config.archive_dir).dates() if all_days else [config.date_str]
+    if not dates:
+        raise Exception("No archived run in " + config.archive_dir)
+    for date_str in dates:
+        print("LOG: Rebuilding", date_str)
+        config.date = datetime.datetime.strptime(date_str, "%Y-%m-%d")
+        Pipeline(config).run(REBUILD_STAGES)
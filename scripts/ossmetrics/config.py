@@ -0,0 +1,104 @@
+import datetime
+import os
+
+
+class Config(object):
+    """
+    Settings of a run, paths are relative to the root of the site
+    """
+
+    def __init__(self, username=None, token=None, api_url="https://api.github.com", data_dir="_data",
+                 metrics_dir="metrics", max_workers=8, stats_deadline=120, cache_dir=".cache/github",
+                 history_db=".cache/history.sqlite", state_dir=".cache/pipeline", date=None,
+                 stage_report=None, snapshot_db=".cache/snapshots.sqlite", refresh_days=7, resume=False,
+                 run_report=".cache/run_report.json", prometheus_report=None, profile_dir=None,
+                 archive_dir=".cache/archive", processes=1, bundle_dir=".cache/bundles", prune_pages=False):
+        self.username = username
+        self.token = token
+        self.api_url = api_url
+        self.data_dir = data_dir
+        self.metrics_dir = metrics_dir
+        # Number of GitHub API requests allowed in flight at the same time, in each process
+        self.max_workers = max_workers
+        # Processes fetching a shard of the plan each, see shards.py
+        self.processes = processes
+        # (index, count) of the shard fetched by a worker process, None for the whole plan
+        self.shard = None
+        # (index, count) of the shard of a multi-node run fetched by this node, see bundles.py
+        self.node_shard = None
+        # Output of every node shard, merged by the merge command
+        self.bundle_dir = bundle_dir
+        # Seconds to wait for GitHub to compute the repository statistics
+        self.stats_deadline = stats_deadline
+        # Directory of the on-disk response cache, empty to disable it
+        self.cache_dir = cache_dir
+        # Store of the weekly and monthly history, rebuilt from _data when missing
+        self.history_db = history_db
+        # Last fetched data of every repository, reused while it is unchanged
+        self.snapshot_db = snapshot_db
+        # Days after which a repository is fetched again even if unchanged
+        self.refresh_days = refresh_days
+        # Raw data of every run, to generate its outputs again, empty to disable it
+        self.archive_dir = archive_dir
+        # Data handed from one stage to the next when they run separately
+        self.state_dir = state_dir
+        # Continue the fetch of the last run from its checkpoint
+        self.resume = resume
+        # Delete the generated pages of the repositories no longer tracked
+        self.prune_pages = prune_pages
+        # Day of the run, today by default
+        self.date = date or datetime.datetime.now()
+        # Time, requests and memory of each stage are written there if set
+        self.stage_report = stage_report
+        # Metrics of the run, written at its end, and in the Prometheus text format if set
+        self.run_report = run_report
+        self.prometheus_report = prometheus_report
+        # CPU and memory profiles of each stage are written there if set
+        self.profile_dir = profile_dir
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        date = None
+        # FETCH_DATE (YYYY-MM-DD) replaces today's date, e.g. for benchmarks
+        if environ.get("FETCH_DATE"):
+            date = datetime.datetime.strptime(environ["FETCH_DATE"], "%Y-%m-%d")
+        return cls(
+            username=environ.get("GH_USERNAME"),
+            token=environ.get("OAUTH_TOKEN"),
+            api_url=environ.get("GITHUB_API_URL", "https://api.github.com"),
+            max_workers=int(environ.get("FETCH_MAX_WORKERS", "8")),
+            processes=int(environ.get("FETCH_PROCESSES", "1")),
+            stats_deadline=int(environ.get("FETCH_STATS_DEADLINE", "120")),
+            cache_dir=environ.get("FETCH_CACHE_DIR", ".cache/github"),
+            history_db=environ.get("FETCH_HISTORY_DB", ".cache/history.sqlite"),
+            state_dir=environ.get("FETCH_STATE_DIR", ".cache/pipeline"),
+            snapshot_db=environ.get("FETCH_SNAPSHOT_DB", ".cache/snapshots.sqlite"),
+            refresh_days=int(environ.get("FETCH_REFRESH_DAYS", "7")),
+            archive_dir=environ.get("FETCH_ARCHIVE_DIR", ".cache/archive"),
+            bundle_dir=environ.get("FETCH_BUNDLE_DIR", ".cache/bundles"),
+            date=date,
+            stage_report=environ.get("FETCH_STAGE_REPORT"),
+            run_report=environ.get("FETCH_RUN_REPORT", ".cache/run_report.json"),
+            prometheus_report=environ.get("FETCH_PROMETHEUS_REPORT"),
+        )
+
+    @property
+    def date_str(self):
+        return self.date.strftime("%Y-%m-%d")
+
+    @property
+    def spool_dir(self):
+        """
+        Normalized repositories of the last fetch, one file per source
+        """
+        return os.path.join(self.state_dir, "spool")
+
+    @property
+    def staging_dir(self):
+        """
+        Outputs of the running pipeline, moved into the site once it succeeded
+        """
+        return os.path.join(self.state_dir, "staging")
+
+    def data_path(self, name):
+        return os.path.join(self.data_dir, name)
@@ -0,0 +1,205 @@
+from . import graphql_queries
+from . import instrument
+
+COMMITS = instrument.counter("contributors_commits_total", "Commits of the default branches paged for their authors")
+COUNTED = instrument.counter("contributors_repositories_total", "Repositories whose contributors were counted, by how",
+                             ("outcome",))
+
+
+def author_key(author):
+    """
+    Who wrote a commit: the GitHub login, or the email of the commits not
+    linked to an account, None when neither is known
+    """
+    if not author:
+        return None
+    if author.get("user") and author["user"].get("login"):
+        return author["user"]["login"]
+    if author.get("email"):
+        return author["email"].lower()
+    return None
+
+
+class _History(object):
+    """
+    Paging state of the history of the default branch of one repository
+
+    The history lists the commits newest first, so a branch merged since
+    the HEAD counted may list commits older than that HEAD after it. When
+    the authors up to a known HEAD are kept, the commits are told apart
+    like git rev-list HEAD ^KNOWN: those reachable from the known HEAD are
+    skipped, and the paging goes on until none of the parents reached
+    from the new commits is left to see.
+    """
+
+    def __init__(self, name, head, known):
+        self.name = name
+        self.repo = tuple(name.split("/", 1))
+        self.head = head
+        self.known_head, self.known_authors = known or (None, [])
+        self.cursor = None
+        self.authors = set()
+        self.outcome = "counted"
+        # Parents of the new commits still to see, and commits reachable from the known HEAD
+        self.wanted = set()
+        self.old = set()
+        self.known_found = False
+        # A commit with more parents than asked for, the whole history is paged
+        self.truncated = False
+
+    def _is_new(self, commit):
+        """
+        Whether a commit is not reachable from the known HEAD, following
+        the parents of the commits seen so far
+        """
+        parents = commit["parents"]
+        parent_oids = [parent["oid"] for parent in parents["nodes"]]
+        if parents["totalCount"] > len(parent_oids):
+            self.truncated = True
+        oid = commit["oid"]
+        self.wanted.discard(oid)
+        if oid == self.known_head or oid in self.old:
+            self.known_found = True
+            self.old.update(parent_oids)
+            self.wanted.difference_update(parent_oids)
+            return False
+        self.wanted.update(parent for parent in parent_oids if parent not in self.old)
+        return True
+
+    def add_page(self, node):
+        """
+        Take the authors of a page, returns True once the history is counted
+        """
+        if node is None:
+            self.outcome = "unavailable"
+            return True
+        ref = node.get("defaultBranchRef")
+        if not ref or not ref.get("target") or "history" not in ref["target"]:
+            self.head = ""
+            self.outcome = "empty"
+            return True
+        target = ref["target"]
+        if self.cursor is None:
+            self.head = target["oid"]
+            if self.head == self.known_head:
+                self.authors.update(self.known_authors)
+                self.outcome = "unchanged"
+                return True
+            self.wanted.add(self.head)
+        page = target["history"]
+        COMMITS.inc(len(page["nodes"]))
+        for commit in page["nodes"]:
+            if self.known_head and not self._is_new(commit):
+                # Counted by an earlier run
+                continue
+            key = author_key(commit.get("author"))
+            if key is not None:
+                self.authors.add(key)
+        done = not page["pageInfo"]["hasNextPage"]
+        if self.known_head and not self.wanted and not self.truncated:
+            # Every commit since the HEAD counted was seen
+            done = True
+        if not done:
+            self.cursor = page["pageInfo"]["endCursor"]
+            return False
+        if self.known_found:
+            # The rest of the history was counted by an earlier run
+            self.authors.update(self.known_authors)
+            self.outcome = "updated"
+        # Without the HEAD counted before, e.g. after a force push, the
+        # pages counted are the whole history
+        return True
+
+
+class ContributorCounter(object):
+    """
+    Count the unique commit authors of the default branch of many repositories
+
+    The histories are paged through GraphQL in rounds: the pages of many
+    repositories go in the same query under aliases, and the queries of a
+    round are sent together by the workers. The authors of every repository
+    are kept in the store with the HEAD they were counted at. A repository
+    whose HEAD did not move costs no request. One whose HEAD moved is paged
+    from its new HEAD until every commit not reachable from the HEAD
+    counted was seen, the branches merged since included, and the new
+    authors are added to the known ones. When that HEAD is not found, e.g.
+    after a force push, the whole history is counted again.
+
+    fetch_batch(repos, query) sends query(repos) for (owner, name) repos and
+    returns the node of each, None for those that failed, or None when the
+    batch must be asked again with at most sizer.size repositories.
+    on_result(name, authors), if given, is called with every repository counted.
+    """
+
+    def __init__(self, fetch_batch, sizer, store, executor, workers, on_result=None):
+        self.fetch_batch = fetch_batch
+        self.sizer = sizer
+        self.store = store
+        self.executor = executor
+        self.workers = workers
+        self.on_result = on_result
+
+    def _finish(self, history, results):
+        COUNTED.inc(outcome=history.outcome)
+        if history.outcome == "unavailable":
+            if not history.known_head:
+                return
+            # The authors counted before stand in
+            authors = history.known_authors
+        else:
+            authors = sorted(history.authors)
+            if history.outcome != "unchanged" and history.head:
+                self.store.put_authors([(history.name, history.head, authors)])
+        results[history.name] = authors
+        if self.on_result is not None:
+            self.on_result(history.name, authors)
+
+    def _send(self, batch):
+        cursors = [history.cursor for history in batch]
+        return self.fetch_batch([history.repo for history in batch],
+                                lambda repos: graphql_queries.history_batch(repos, cursors))
+
+    def count(self, heads, done=()):
+        """
+        Returns {name: sorted authors} of the repositories of heads,
+        {name: HEAD oid}, the HEAD being "" for an empty repository and None
+        when not known. The repositories of done are left out, and those
+        GitHub could not page and which were never counted
+        """
+        # Sorted, the pages of the fetch do not complete in the same order every run
+        names = sorted(name for name in heads if name not in done)
+        known = self.store.get_authors(names)
+        results = {}
+        queue = []
+        for name in names:
+            history = _History(name, heads[name], known.get(name))
+            if heads[name] == "":
+                history.outcome = "empty"
+                self._finish(history, results)
+            elif heads[name] is not None and heads[name] == history.known_head:
+                history.authors.update(history.known_authors)
+                history.outcome = "unchanged"
+                self._finish(history, results)
+            else:
+                queue.append(history)
+
+        # A round takes the next page of up to a batch of histories per
+        # worker, those counted make room for the next ones in the queue
+        paged = len(queue)
+        queue.reverse()
+        active = []
+        while queue or active:
+            size = self.sizer.size
+            while len(active) < size * self.workers and queue:
+                active.append(queue.pop())
+            batches = [active[i:i + size] for i in range(0, len(active), size)]
+            for batch, nodes in zip(batches, self.executor.map(self._send, batches)):
+                if nodes is None:
+                    # Asked again, smaller, in the next round
+                    continue
+                for history, node in zip(batch, nodes):
+                    if history.add_page(node):
+                        active.remove(history)
+                        self._finish(history, results)
+        print("LOG: Contributors counted:", len(results), "paged:", paged, "left out:", len(done))
+        return results
@@ -0,0 +1,477 @@
+import concurrent.futures
+import datetime
+import json
+import threading
+
+from . import archive
+from . import bundles
+from . import checkpoint
+from . import contributors
+from . import github_client
+from . import graphql_queries
+from . import instrument
+from . import normalize
+from . import page_size
+from . import response_cache
+from . import snapshot_store
+from . import spool
+from . import stats_jobs
+
+
+PAGES = instrument.counter("fetch_pages_total", "Pages and batches of GraphQL queries", ("kind", "outcome"))
+PAGE_SIZE = instrument.histogram("fetch_page_size", "Items asked for by the pages that succeeded", ("kind",),
+                                 buckets=instrument.SIZE_BUCKETS)
+REPOSITORIES = instrument.gauge("fetch_repositories", "Repositories by how their data was obtained", ("source",),
+                                add_up=True)
+
+
+def create_client(config):
+    """
+    Pooled session shared by all the requests to GitHub
+    """
+    if not config.username or not config.token:
+        raise Exception("GH_USERNAME and OAUTH_TOKEN must be set to fetch from GitHub")
+    cache = response_cache.ResponseCache(config.cache_dir) if config.cache_dir else None
+    return github_client.GitHubClient(config.username, config.token, config.api_url,
+                                      pool_size=config.max_workers, cache=cache)
+
+
+def send_page(client, sizer, size, query, variables, kind, cached=True):
+    """
+    Send a page of size items and report its time and bytes to sizer
+
+    A page failing with an error or a limit of GitHub shrinks sizer and
+    None is returned, to ask again for sizer.size items from the same
+    cursor. At the minimum size errors are raised and the response is
+    returned along with its limit errors.
+    """
+    responses = []
+    try:
+        response = client.graphql(query, variables, kind=kind, timeout=page_size.QUERY_TIMEOUT,
+                                  max_retries=None if size <= sizer.minimum else 1,
+                                  on_response=responses.append, cached=cached)
+    except Exception as error:
+        PAGES.inc(kind=kind, outcome="failed")
+        if not sizer.shrink(size):
+            raise
+        print("LOG: Page of", size, kind, "items failed, asking for", sizer.size, "after:", error)
+        return None
+
+    errors = graphql_queries.limit_errors(response)
+    PAGES.inc(kind=kind, outcome="failed" if errors else "ok")
+    if not errors:
+        PAGE_SIZE.observe(size, kind=kind)
+    if errors and sizer.shrink(size):
+        print("LOG: Page of", size, kind, "items failed, asking for", sizer.size, "after:",
+              [error.get("message") for error in errors])
+        return None
+    if responses and not errors:
+        sizer.observe(size, responses[-1].elapsed.total_seconds(), len(responses[-1].content))
+    return response
+
+
+def fetch_org_fingerprints(client, org, on_page, num_of_pages=0, end_cursor=None):
+    """
+    Page through the fingerprints of the repositories of one organization,
+    from the page num_of_pages starting after end_cursor
+    on_page(page, nodes, page_info, members) is called with the repository
+    nodes of every page, its pageInfo and the members count
+    The page size adapts to how fast GitHub answers, and a failed page is
+    asked again, smaller, from the last good cursor.
+    Returns the members count of the organization
+    """
+    sizer = page_size.AdaptivePageSize(graphql_queries.ORG_PAGE_SIZE, maximum=graphql_queries.ORG_PAGE_SIZE)
+    members = None
+    has_next_page = False
+    while True:
+        first = sizer.size
+        print("Num of pages", num_of_pages, "for", org)
+        variables = json.dumps({"owner": org, "endCursor": end_cursor, "first": first})
+
+        print("Sending request for", org)
+        response = send_page(client, sizer, first, graphql_queries.org_fingerprints, variables, "fingerprint")
+        print("Received request for", org)
+        if response is None:
+            continue
+
+        if graphql_queries.limit_errors(response) or not response["data"]["organization"]:
+            raise Exception("Could not fetch the repositories of {}: {}".format(
+                org, [error.get("message") for error in response.get("errors") or []]))
+
+        if response["data"]["organization"]["membersWithRole"]["totalCount"]:
+            members = response["data"]["organization"]["membersWithRole"]["totalCount"]
+
+        pageInfo = response["data"]["organization"]["repositories"]["pageInfo"]
+        on_page(num_of_pages, response["data"]["organization"]["repositories"]["nodes"], pageInfo, members)
+
+        has_next_page = pageInfo["hasNextPage"]
+        end_cursor = pageInfo["endCursor"]
+        print("end_cursor", end_cursor, "for", org)
+        num_of_pages += 1
+        if not has_next_page:
+            break
+
+    return members
+
+
+def fetch_repository_batch(client, repos, query=graphql_queries.repos_batch, kind="full", sizer=None, cached=True):
+    """
+    Fetch the data of several individual repositories with one query
+    Returns the repository of each (owner, name), None if its lookup failed
+    With a sizer, None is returned when the batch failed as a whole and
+    must be asked again with at most sizer.size repositories
+    """
+    if sizer is None:
+        response = client.graphql(query(repos), {}, kind=kind, cached=cached)
+    else:
+        response = send_page(client, sizer, len(repos), query(repos), {}, kind, cached)
+        if response is None:
+            return None
+    repositories = []
+    for repo, (node, errors) in zip(repos, graphql_queries.split_batch_response(repos, response)):
+        if errors or not node:
+            print("LOG: Skipping", "/".join(repo), [error.get("message") for error in errors])
+            node = None
+        repositories.append(node)
+    return repositories
+
+
+def page_source(org_index, org, page):
+    return spool.source_file(org_index, "{0}-{1:04d}".format(org, page))
+
+
+def completed_future(result=None):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+class PageHandler(object):
+    """
+    Turn every page of fingerprints into snapshots and queue them to the spool
+
+    Private and excluded repositories are left out. The full set of fields
+    is only fetched for the repositories which are new, whose fingerprint
+    changed or whose snapshot is older than refresh_days; the others are
+    taken from the snapshot store. Only the names of the repositories are
+    kept in memory, for the statistics.
+
+    Every page is recorded to the checkpoint once written to the spool,
+    and the pages recorded by a resumed run are not fetched again. With a
+    manifest, the raw nodes fetched go to the response archive and each
+    page is listed in the manifest of the run.
+
+    With owns, a run of one shard of a multi-node run keeps only the
+    repositories owns(full name) is true for, and the order of all the
+    repositories of each page, for the merge of the shards.
+    """
+
+    def __init__(self, client, spool_writer, store, run_log, exclude, today, refresh_days, manifest=None,
+                 owns=None):
+        self.client = client
+        self.spool_writer = spool_writer
+        self.store = store
+        self.run_log = run_log
+        self.manifest = manifest
+        self.exclude = exclude
+        self.owns = owns
+        # Source -> full names of its repositories in order, of every shard
+        self.order = {}
+        # Full name -> HEAD of its default branch, see graphql_queries.head_oid
+        self.heads = {}
+        self.today = today.strftime("%Y-%m-%d")
+        self.refresh_after = (today - datetime.timedelta(days=refresh_days)).strftime("%Y-%m-%d")
+        self.received = {"org": 0, "repo": 0}
+        self.counts = {"reused": 0, "fetched": 0, "resumed": 0}
+        # Batches of full fields shrink when GitHub times out on them
+        self.batch_size = page_size.AdaptivePageSize(graphql_queries.REPOS_PER_QUERY,
+                                                     maximum=graphql_queries.REPOS_PER_QUERY)
+        self.names = []
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def _is_current(self, node, known):
+        if known is None:
+            return False
+        fingerprint, fetched, _, digest = known
+        if self.manifest is not None and digest is None:
+            # Fetched before the archive, its raw node is needed once
+            return False
+        return fingerprint == graphql_queries.fingerprint(node) and fetched > self.refresh_after
+
+    def _add_names(self, names):
+        with self._lock:
+            for name in names:
+                if name not in self._seen:
+                    self._seen.add(name)
+                    self.names.append(name)
+
+    def resume(self, unit):
+        """
+        Take the repositories of a unit of the resumed run
+        """
+        self._add_names(unit["names"])
+        with self._lock:
+            self.counts["resumed"] += len(unit["names"])
+            self.heads.update(zip(unit["names"], unit.get("heads") or [None] * len(unit["names"])))
+            if "order" in unit:
+                self.order[unit["source"]] = unit["order"]
+
+    def handle(self, source, kind, nodes, unit):
+        nodes = [node for node in nodes if node]
+        selected = []
+        order = []
+        for node in nodes:
+            if node["isPrivate"]:
+                continue
+            if node["nameWithOwner"] in self.exclude:
+                print("LOG: Excluding", node["nameWithOwner"])
+                continue
+            order.append(node["nameWithOwner"])
+            if self.owns is not None and not self.owns(node["nameWithOwner"]):
+                continue
+            selected.append(node)
+
+        known = self.store.get_many([node["nameWithOwner"] for node in selected])
+        changed = [node["nameWithOwner"] for node in selected
+                   if not self._is_current(node, known.get(node["nameWithOwner"]))]
+        fetched = {}
+        i = 0
+        while i < len(changed):
+            batch = [tuple(name.split("/", 1)) for name in changed[i:i + self.batch_size.size]]
+            full_nodes = fetch_repository_batch(self.client, batch, sizer=self.batch_size)
+            if full_nodes is None:
+                continue
+            for full_node in full_nodes:
+                if full_node:
+                    digest = self.manifest.archive.put(full_node) if self.manifest is not None else None
+                    fetched[full_node["nameWithOwner"]] = (normalize.normalize_repository(full_node).to_row(), digest)
+            i += len(batch)
+
+        rows = []
+        digests = []
+        updates = []
+        for node in selected:
+            name = node["nameWithOwner"]
+            if name in fetched:
+                row, digest = fetched[name]
+                updates.append((name, graphql_queries.fingerprint(node), self.today, row, digest))
+            elif name in known:
+                # Unchanged, or its lookup failed and the last snapshot stands in
+                _, _, row, digest = known[name]
+            else:
+                continue
+            rows.append(row)
+            digests.append([name, digest])
+        self.store.put_many(updates)
+
+        heads = dict((node["nameWithOwner"], graphql_queries.head_oid(node)) for node in selected)
+        unit = dict(unit, names=[row[0] for row in rows])
+        unit["heads"] = [heads[name] for name in unit["names"]]
+        with self._lock:
+            self.received[kind] += len(nodes)
+            self.counts["fetched"] += len(fetched)
+            self.counts["reused"] += len(rows) - len(fetched)
+            self.heads.update(zip(unit["names"], unit["heads"]))
+        if self.owns is not None:
+            unit.update(source=source, order=order)
+            with self._lock:
+                self.order[source] = order
+        self._add_names(unit["names"])
+
+        def done():
+            if self.manifest is not None:
+                self.manifest.source(source, digests)
+            self.run_log.record(unit)
+
+        self.spool_writer.put(source, rows, done)
+
+    def org_repositories(self, executor, org_index, org):
+        """
+        Returns the members count of the organization and the future of every page
+        """
+        page_futures = []
+        members = None
+        done = self.run_log.org_pages(org)
+        for unit in done:
+            self.resume(unit)
+            members = unit["members"] or members
+            page_futures.append(completed_future())
+        if done and not done[-1]["hasNextPage"]:
+            return members, page_futures
+
+        def on_page(page, nodes, page_info, page_members):
+            unit = {"unit": "page", "org": org, "page": page, "endCursor": page_info["endCursor"],
+                    "hasNextPage": page_info["hasNextPage"], "members": page_members}
+            page_futures.append(executor.submit(self.handle, page_source(org_index, org, page), "org", nodes, unit))
+
+        if done:
+            print("LOG: Resuming", org, "after page", len(done) - 1)
+            members = fetch_org_fingerprints(self.client, org, on_page, len(done), done[-1]["endCursor"]) or members
+        else:
+            members = fetch_org_fingerprints(self.client, org, on_page)
+        return members, page_futures
+
+    def repository_batch(self, source, repos):
+        nodes = fetch_repository_batch(self.client, repos, graphql_queries.fingerprints_batch, kind="fingerprint")
+        self.handle(source, "repo", nodes, {"unit": "batch", "source": source})
+
+
+def log_graphql_costs(client, counts):
+    """
+    Points spent by kind of query, and about how many the unchanged repositories saved
+    """
+    for kind, (queries, points) in sorted(client.graphql_costs.items()):
+        print("LOG: GraphQL", kind, "queries:", queries, "points:", points)
+    _, points = client.graphql_costs.get("full", (0, 0))
+    if counts["fetched"] and points:
+        print("LOG: GraphQL points saved by the unchanged repositories: about",
+              int(points * counts["reused"] / counts["fetched"]))
+
+
+def fetch(config, plan, client):
+    """
+    Fetch the public repositories of the plan and their statistics
+
+    The normalized repositories are spooled to the state directory, one
+    file per page of an organization or batch of repositories. Every unit
+    of work is checkpointed, and with config.resume a run which failed the
+    same day continues from where it stopped. The raw repositories and
+    statistics are kept in the response archive of config.archive_dir.
+
+    With config.shard = (index, count), only the organizations and batches
+    of individual repositories whose position in the plan is index modulo
+    count are fetched, into the spool shared by the shards, see shards.py.
+    With config.node_shard = (index, count), only the repositories hashed
+    to that shard of a multi-node run are fetched, see bundles.py, and the
+    order of the repositories of every source is returned too.
+    Returns {"members": count, "org_members": {org: count}, "sources": [spool file],
+    "stats": {repo: summary}}, with "order": {source: [full name]} for a node shard
+    """
+    print("LOG: Fetching with", config.max_workers, "concurrent requests")
+    shard = config.shard
+    key = plan.key(config.date_str)
+    # A shard resumes the checkpoint of the same shard only
+    run_key = key if shard is None else dict(key, shard=list(shard))
+    owns = None
+    if config.node_shard is not None:
+        run_key = dict(run_key, node_shard=list(config.node_shard))
+        owns = bundles.HashRing(config.node_shard[1]).owns(config.node_shard[0])
+    checkpoint_file = checkpoint.checkpoint_file(shard)
+    run_log = checkpoint.Checkpoint.resume(config.spool_dir, run_key, checkpoint_file) if config.resume else None
+    resumed = run_log is not None
+    # The shards write to a spool their parent emptied
+    spool_writer = spool.SpoolWriter(config.spool_dir, resume=resumed or shard is not None)
+    if not resumed:
+        run_log = checkpoint.Checkpoint.start(config.spool_dir, run_key, checkpoint_file)
+
+    manifest = None
+    if config.archive_dir:
+        manifest = archive.RunManifest(archive.ResponseArchive(config.archive_dir), config.date_str,
+                                       archive.run_key(key, config.node_shard), resume=resumed, shard=shard)
+
+    def in_shard(position):
+        return shard is None or position % shard[1] == shard[0]
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.max_workers)
+    store = snapshot_store.SnapshotStore(config.snapshot_db)
+    handler = PageHandler(client, spool_writer, store, run_log, plan.exclude, config.date, config.refresh_days,
+                          manifest, owns)
+
+    # Organizations paginate in parallel with the individual repositories,
+    # and every page is handled as soon as its fingerprints arrive
+    org_futures = [(index, executor.submit(handler.org_repositories, executor, index, org))
+                   for index, org in enumerate(plan.orgs) if in_shard(index)]
+    repo_sources = []
+    repo_futures = []
+    done_batches = run_log.batches()
+    for i in range(0, len(plan.repos), graphql_queries.FINGERPRINTS_PER_QUERY):
+        position = len(plan.orgs) + i // graphql_queries.FINGERPRINTS_PER_QUERY
+        if not in_shard(position):
+            continue
+        repo_sources.append(spool.source_file(position, "repositories"))
+        if repo_sources[-1] in done_batches:
+            handler.resume(done_batches[repo_sources[-1]])
+            continue
+        repo_futures.append(executor.submit(handler.repository_batch, repo_sources[-1],
+                                            plan.repos[i:i + graphql_queries.FINGERPRINTS_PER_QUERY]))
+
+    try:
+        members = None
+        org_members = {}
+        sources = []
+        for index, future in org_futures:
+            org = plan.orgs[index]
+            org_members[org], page_futures = future.result()
+            if org_members[org]:
+                members = org_members[org]
+            for page, page_future in enumerate(page_futures):
+                page_future.result()
+                sources.append(page_source(index, org, page))
+        print("LOG: Fetched all the org repositories. Count:", handler.received["org"])
+        for future in repo_futures:
+            future.result()
+        sources.extend(repo_sources)
+        print("LOG: Fetched all the individual repos as well. Count:", handler.received["repo"])
+    finally:
+        spool_writer.close()
+        store.close()
+
+    print("LOG: Repositories fetched:", handler.counts["fetched"], "unchanged:", handler.counts["reused"],
+          "resumed:", handler.counts["resumed"])
+    for source, count in handler.counts.items():
+        REPOSITORIES.set(count, source=source)
+    log_graphql_costs(client, handler.counts)
+
+    # Contributors, from the authors of the commits of the default branches
+    def record_authors(repo, authors):
+        if manifest is not None:
+            manifest.stats(repo, "authors", authors)
+        run_log.record({"unit": "stats", "repo": repo, "endpoint": "authors",
+                        "summary": stats_jobs.summarize_endpoint("authors", authors)})
+
+    history_size = page_size.AdaptivePageSize(graphql_queries.HISTORY_REPOS_PER_QUERY,
+                                              maximum=graphql_queries.HISTORY_REPOS_PER_QUERY)
+    store = snapshot_store.SnapshotStore(config.snapshot_db)
+    try:
+        counter = contributors.ContributorCounter(
+            lambda repos, query: fetch_repository_batch(client, repos, query, "history", history_size, cached=False),
+            history_size, store, executor, config.max_workers, on_result=record_authors)
+        done = run_log.stats()
+        authors = counter.count(dict((name, handler.heads.get(name)) for name in handler.names),
+                                done=set(repo for repo, summaries in done.items() if "authors" in summaries))
+    finally:
+        store.close()
+
+    # Activity statistics, computed by GitHub for all repositories at once
+    def fetch_stats(repo, endpoint):
+        status_code, payload = client.get_json("/repos/" + repo + "/stats/" + endpoint)
+        if status_code == 200 and manifest is not None:
+            manifest.stats(repo, endpoint, payload)
+        return status_code, payload
+
+    def record_stats(repo, endpoint, summary):
+        run_log.record({"unit": "stats", "repo": repo, "endpoint": endpoint, "summary": summary})
+
+    stats_poller = stats_jobs.StatsPoller(fetch_stats, executor, deadline=config.stats_deadline,
+                                          reduce=stats_jobs.summarize_endpoint, on_result=record_stats)
+    stats = stats_poller.collect(handler.names, done=done)
+    for repo, repo_authors in authors.items():
+        stats[repo]["authors"] = stats_jobs.summarize_endpoint("authors", repo_authors)
+    executor.shutdown()
+    run_log.close()
+    if manifest is not None:
+        manifest.complete(sources, members)
+        manifest.close()
+    if client.cache is not None:
+        client.cache.report()
+
+    fetched = {
+        "members": members,
+        "org_members": org_members,
+        "sources": sources,
+        "stats": dict((repo, stats_jobs.merge_summaries(summaries.values())) for repo, summaries in stats.items()),
+    }
+    if owns is not None:
+        fetched["order"] = handler.order
+    return fetched
@@ -0,0 +1,305 @@
+import calendar
+import datetime
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+from . import instrument
+from . import response_cache
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+REQUESTS = instrument.counter("github_requests_total", "Requests sent to GitHub",
+                              ("resource", "endpoint", "status"))
+REQUEST_SECONDS = instrument.histogram("github_request_seconds", "Time to get the response of a request",
+                                       ("resource", "endpoint"))
+RESPONSE_BYTES = instrument.counter("github_response_bytes_total", "Bytes downloaded from GitHub",
+                                    ("resource", "endpoint"))
+RETRIES = instrument.counter("github_retries_total", "Requests sent again after a failure", ("resource", "reason"))
+RATE_LIMIT_REMAINING = instrument.gauge("github_rate_limit_remaining", "Requests or points left until the reset",
+                                        ("resource",))
+RATE_LIMIT_WAIT = instrument.counter("github_rate_limit_wait_seconds_total",
+                                     "Seconds waited for the rate limit reset", ("resource",))
+GRAPHQL_QUERIES = instrument.counter("graphql_queries_total", "GraphQL queries sent", ("kind",))
+GRAPHQL_COST = instrument.counter("graphql_cost_points_total", "GraphQL points spent", ("kind",))
+GRAPHQL_SECONDS = instrument.histogram("graphql_query_seconds", "Time of a GraphQL query, retries included",
+                                       ("kind",))
+
+
+def endpoint_label(path):
+    """
+    Path of a request without the repository, e.g. /repos/:owner/:repo/stats/contributors
+    """
+    parts = path.split("?")[0].split("/")
+    if len(parts) > 3 and parts[1] == "repos":
+        parts[2:4] = [":owner", ":repo"]
+    return "/".join(parts)
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait given by a Retry-After header, either seconds or an
+    HTTP date, None when it is neither
+    """
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(date.timestamp() - time.time(), 0)
+
+
+def parse_reset_at(reset_at):
+    """
+    Convert the GraphQL rateLimit resetAt date to a unix timestamp
+    """
+    date = datetime.datetime.strptime(reset_at, "%Y-%m-%dT%H:%M:%SZ")
+    return calendar.timegm(date.timetuple())
+
+
+class GitHubClient(object):
+    """
+    Pooled HTTP session shared by the GraphQL queries and the REST calls
+
+    Transient failures (5xx, secondary rate limits, connection errors) are
+    retried with jittered exponential backoff. The rate limit reported by
+    GitHub is tracked per resource, and requests wait for the reset when
+    the remaining budget would not cover the requests in flight.
+    """
+
+    def __init__(self, username, token, api_url="https://api.github.com",
+                 pool_size=8, max_retries=6, backoff=1, max_backoff=60, cache=None):
+        self.api_url = api_url
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Budget kept in reserve for the requests already in flight
+        self.reserve = {"core": pool_size, "graphql": pool_size}
+
+        self.session = requests.Session()
+        self.session.auth = (username, token)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        # Notified when a rate limit changes, for the requests waiting for its reset
+        self._rate_limit_changed = threading.Condition(self._lock)
+        self._rate_limits = {}  # resource -> (remaining, reset timestamp)
+        self.request_count = 0
+        # kind of query -> [queries sent, GraphQL points spent]
+        self.graphql_costs = {}
+
+    def rate_limit(self, resource):
+        """
+        Returns the last known (remaining, reset timestamp) of a resource
+        """
+        with self._lock:
+            return self._rate_limits.get(resource)
+
+    def _update_rate_limit(self, resource, remaining, reset):
+        with self._lock:
+            self._rate_limits[resource] = (remaining, reset)
+            self._rate_limit_changed.notify_all()
+        RATE_LIMIT_REMAINING.set(remaining, resource=resource)
+
+    def _throttle(self, resource):
+        """
+        Wait for the rate limit reset before running out of budget
+
+        The rate limit is kept until its reset time has passed, so every
+        request sent meanwhile waits for it, not only the first one.
+        """
+        with self._lock:
+            while True:
+                remaining, reset = self._rate_limits.get(resource, (None, None))
+                if remaining is None or remaining > self.reserve[resource]:
+                    return
+                wait = reset - time.time() + 1
+                if wait <= 0:
+                    # The budget is restored once the reset time is reached
+                    self._rate_limits[resource] = (None, None)
+                    return
+                print("LOG: Rate limit of", resource, "almost reached, waiting", int(wait), "seconds")
+                started = time.monotonic()
+                self._rate_limit_changed.wait(wait)
+                RATE_LIMIT_WAIT.inc(time.monotonic() - started, resource=resource)
+
+    def _retry_delay(self, attempt, response=None):
+        """
+        Seconds to wait before the next attempt, honoring Retry-After
+        """
+        if response is not None and response.headers.get("Retry-After"):
+            delay = parse_retry_after(response.headers["Retry-After"])
+            if delay is not None:
+                return delay
+        if (response is not None and response.headers.get("X-RateLimit-Remaining") == "0"
+                and response.headers.get("X-RateLimit-Reset")):
+            return max(float(response.headers["X-RateLimit-Reset"]) - time.time() + 1, 0)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _is_rate_limited(response):
+        if response.status_code not in (403, 429):
+            return False
+        if response.headers.get("Retry-After") or response.headers.get("X-RateLimit-Remaining") == "0":
+            return True
+        return "rate limit" in response.text.lower()
+
+    def request(self, method, path, resource="core", max_retries=None, **kwargs):
+        """
+        Send one request, retrying the transient failures up to max_retries
+        times, the max_retries of the client by default
+        Returns the last response, whatever its status code
+        """
+        url = self.api_url + path
+        endpoint = endpoint_label(path)
+        if max_retries is None:
+            max_retries = self.max_retries
+        attempt = 0
+        while True:
+            self._throttle(resource)
+            with self._lock:
+                self.request_count += 1
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                REQUESTS.inc(resource=resource, endpoint=endpoint, status=type(error).__name__)
+                if attempt >= max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                print("LOG: Retrying", path, "in", round(delay, 1), "seconds after", type(error).__name__)
+                RETRIES.inc(resource=resource, reason=type(error).__name__)
+            else:
+                REQUESTS.inc(resource=resource, endpoint=endpoint, status=response.status_code)
+                REQUEST_SECONDS.observe(time.monotonic() - started, resource=resource, endpoint=endpoint)
+                RESPONSE_BYTES.inc(len(response.content), resource=resource, endpoint=endpoint)
+                if "X-RateLimit-Remaining" in response.headers and "X-RateLimit-Reset" in response.headers:
+                    self._update_rate_limit(
+                        response.headers.get("X-RateLimit-Resource", resource),
+                        int(response.headers["X-RateLimit-Remaining"]),
+                        int(response.headers["X-RateLimit-Reset"]))
+
+                retry = response.status_code in RETRY_STATUS_CODES or self._is_rate_limited(response)
+                if not retry or attempt >= max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                print("LOG: Retrying", path, "in", round(delay, 1), "seconds after status", response.status_code)
+                RETRIES.inc(resource=resource, reason=response.status_code)
+
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, path):
+        """
+        Request the GitHub REST API
+        """
+        return self.request("GET", path, resource="core")
+
+    def get_json(self, path):
+        """
+        Request the GitHub REST API through the response cache
+        Returns the status code and the decoded payload of 200 responses
+        """
+        if self.cache is None:
+            r = self.get(path)
+            return r.status_code, r.json() if r.status_code == 200 else None
+
+        key = response_cache.request_key("GET", path)
+        entry = self.cache.get(key)
+        if entry and self.cache.is_fresh(entry, path):
+            self.cache.record("hit")
+            return 200, entry["body"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        r = self.request("GET", path, resource="core", headers=headers)
+        if r.status_code == 304:
+            self.cache.record("revalidated")
+            self.cache.refresh(key, entry)
+            return 200, entry["body"]
+
+        if r.status_code == 202:
+            # Not computed yet, the request is polled again and counted once answered
+            self.cache.record("pending")
+            return r.status_code, None
+        self.cache.record("miss")
+        if r.status_code != 200:
+            return r.status_code, None
+        payload = r.json()
+        self.cache.put(key, payload, r.headers.get("ETag"))
+        return 200, payload
+
+    def graphql(self, query_string, variables, kind="query", timeout=None, max_retries=None, on_response=None,
+                cached=True):
+        """
+        Request the GitHub GraphQL API
+        Responses without errors are kept in the response cache, unless cached is False
+        The points spent by the queries reporting their rateLimit cost
+        are logged and added up by kind in graphql_costs
+        on_response(r), if given, is called with the HTTP response of the
+        query, so the caller can see how long it took and how large it was
+        """
+        key = None
+        if self.cache is not None and cached:
+            key = response_cache.request_key("POST", "/graphql", {"query": query_string, "variables": variables})
+            entry = self.cache.get(key)
+            if entry and self.cache.is_fresh(entry, "/graphql"):
+                self.cache.record("hit")
+                return entry["body"]
+            self.cache.record("miss")
+
+        with GRAPHQL_SECONDS.time(kind=kind):
+            return self._graphql(query_string, variables, kind, key, timeout, max_retries, on_response)
+
+    def _graphql(self, query_string, variables, kind, key, timeout, max_retries, on_response):
+        attempt = 0
+        while True:
+            GRAPHQL_QUERIES.inc(kind=kind)
+            r = self.request("POST", "/graphql", resource="graphql", max_retries=max_retries, timeout=timeout,
+                             json={"query": query_string, "variables": variables})
+            if on_response is not None:
+                on_response(r)
+            if r.status_code != 200:
+                raise Exception("Error in GitHub API query. Status Code : {}, Response: {}".format(r.status_code, r.text))
+
+            response = r.json()
+            rate_limit = (response.get("data") or {}).get("rateLimit")
+            if rate_limit:
+                self._update_rate_limit("graphql", rate_limit["remaining"], parse_reset_at(rate_limit["resetAt"]))
+                with self._lock:
+                    self.reserve["graphql"] = max(self.reserve["graphql"], rate_limit["cost"])
+                    costs = self.graphql_costs.setdefault(kind, [0, 0])
+                    costs[0] += 1
+                    costs[1] += rate_limit["cost"]
+                GRAPHQL_COST.inc(rate_limit["cost"], kind=kind)
+                print("LOG: GraphQL cost", rate_limit["cost"], "for", kind, "query")
+
+            errors = response.get("errors") or []
+            if attempt < self.max_retries and any(error.get("type") == "RATE_LIMITED" for error in errors):
+                # Out of budget, the next attempt waits for the reset
+                _, reset = self.rate_limit("graphql") or (None, None)
+                if not reset:
+                    reset = time.time() + self._retry_delay(attempt)
+                self._update_rate_limit("graphql", 0, reset)
+                print("LOG: GraphQL rate limited, retrying after the reset")
+                RETRIES.inc(resource="graphql", reason="RATE_LIMITED")
+                attempt += 1
+                continue
+
+            if key is not None and not errors:
+                self.cache.put(key, response)
+            return response
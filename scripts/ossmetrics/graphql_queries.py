@@ -0,0 +1,257 @@
+import json
+
+# Fields fetched for every repository, shared by all the queries
+repo_fields = """
+fragment RepoFields on Repository {
+  nameWithOwner
+  name
+  descriptionHTML
+  homepageUrl
+  isPrivate
+  repositoryTopics(first: 50) {
+    edges {
+      node {
+        topic {
+          name
+        }
+        url
+      }
+    }
+  }
+  primaryLanguage {
+    name
+    color
+  }
+  languages (first: 50) {
+    edges {
+      node {
+        name
+      }
+      size
+    }
+  }
+  pushedAt
+  forkCount
+  stargazers {
+    totalCount
+  }
+  watchers {
+    totalCount
+  }
+  defaultBranchRef{
+      target{
+          ... on Commit {
+              history(first:10){
+                  totalCount
+              }
+          }
+      }
+  }
+  pull_request: pullRequests {
+      totalCount
+  }
+  open_pull_request: pullRequests(states:[OPEN]) {
+      totalCount
+  }
+  merged_pull_request: pullRequests(states:[MERGED]) {
+      totalCount
+  }
+  closed_pull_request: pullRequests(states:[CLOSED]) {
+      totalCount
+  }
+  issue: issues {
+      totalCount
+  }
+  open_issue: issues(states:[OPEN]) {
+      totalCount
+  }
+  closed_issue: issues(states:[CLOSED]) {
+      totalCount
+  }
+}
+"""
+
+# Fields telling whether a repository changed since it was last fetched
+fingerprint_fields = """
+fragment Fingerprint on Repository {
+  nameWithOwner
+  isPrivate
+  pushedAt
+  updatedAt
+  stargazerCount
+  forkCount
+  defaultBranchRef {
+    target {
+      oid
+    }
+  }
+}
+"""
+
+# GitHub returns at most 100 nodes per page
+ORG_PAGE_SIZE = 100
+
+org_fingerprints = """
+query ($owner: String!, $endCursor: String, $first: Int!) {
+  organization(login: $owner) {
+    repositories(first: $first, after: $endCursor) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      totalCount
+      nodes {
+        ...Fingerprint
+      }
+    }
+    membersWithRole {
+      totalCount
+    }
+  }
+  rateLimit {
+    cost
+    remaining
+    resetAt
+  }
+}
+""" + fingerprint_fields
+
+# GitHub rejects queries that could return more than 500,000 nodes.
+# Each repository asks for up to 50 topics and 50 languages, plus the
+# single objects and connections of RepoFields.
+MAX_QUERY_NODES = 500000
+NODES_PER_REPO = 50 + 50 + 16
+# Above this the query is likely to time out before the node limit
+MAX_REPOS_PER_QUERY = 50
+REPOS_PER_QUERY = min(MAX_REPOS_PER_QUERY, MAX_QUERY_NODES // NODES_PER_REPO)
+# Fingerprints have no connection, a batch is as large as a page
+FINGERPRINTS_PER_QUERY = 100
+
+# Commits of the default branch asked for per repository and page
+COMMITS_PER_PAGE = 100
+# A page of commits is far below the node limit, but a query walking the
+# history of many repositories at once runs long
+HISTORY_REPOS_PER_QUERY = 20
+# Authors of the commits of a page of the history of the default branch,
+# with their parents to tell the commits merged since the last count. Few
+# merges have more parents than asked for, see contributors._History.
+history_fields = """
+fragment AuthorPage on CommitHistoryConnection {
+  pageInfo {
+    hasNextPage
+    endCursor
+  }
+  nodes {
+    oid
+    parents(first: 8) {
+      totalCount
+      nodes {
+        oid
+      }
+    }
+    author {
+      email
+      user {
+        login
+      }
+    }
+  }
+}
+"""
+
+
+def repo_alias(index):
+    return "r{}".format(index)
+
+
+def repos_batch(repos, fragment="RepoFields", fields=repo_fields):
+    """
+    Query fetching several (owner, name) repositories in one request
+    Each repository is returned under the alias given by repo_alias
+    """
+    return _aliased_query(repos, ["...{}".format(fragment)] * len(repos), fields)
+
+
+def history_batch(repos, cursors):
+    """
+    A page of the authors of the default branch of several (owner, name)
+    repositories in one request, each after its cursor, None for the first
+    """
+    selections = []
+    for cursor in cursors:
+        after = ", after: {}".format(json.dumps(cursor)) if cursor else ""
+        selections.append("defaultBranchRef {{ target {{ ... on Commit {{ oid history(first: {}{}) "
+                          "{{ ...AuthorPage }} }} }} }}".format(COMMITS_PER_PAGE, after))
+    return _aliased_query(repos, selections, history_fields)
+
+
+def _aliased_query(repos, selections, fields):
+    lines = ["query {"]
+    for index, ((owner, name), selection) in enumerate(zip(repos, selections)):
+        lines.append("  {}: repository(owner: {}, name: {}) {{ {} }}".format(
+            repo_alias(index), json.dumps(owner), json.dumps(name), selection))
+    lines.append("  rateLimit {")
+    lines.append("    cost")
+    lines.append("    remaining")
+    lines.append("    resetAt")
+    lines.append("  }")
+    lines.append("}")
+    return "\n".join(lines) + "\n" + fields
+
+
+def fingerprints_batch(repos):
+    """
+    Fingerprints of several (owner, name) repositories in one request
+    """
+    return repos_batch(repos, "Fingerprint", fingerprint_fields)
+
+
+def fingerprint(node):
+    return [node["pushedAt"], node["updatedAt"], node["stargazerCount"], node["forkCount"]]
+
+
+def head_oid(node):
+    """
+    HEAD of the default branch of a fingerprint, "" for an empty repository
+    and None for a fingerprint without it
+    """
+    if "defaultBranchRef" not in node:
+        return None
+    ref = node["defaultBranchRef"]
+    return ref["target"]["oid"] if ref and ref.get("target") else ""
+
+
+# Errors of a query too large or too slow for GitHub, a smaller one may succeed
+LIMIT_ERROR_TYPES = ("MAX_NODE_LIMIT_EXCEEDED", "RESOURCE_LIMITS_EXCEEDED", "TIMEOUT")
+
+
+def limit_errors(response):
+    """
+    Errors telling that the query failed as a whole, e.g. it timed out
+    Errors of a single repository, like NOT_FOUND, are not included
+    """
+    errors = response.get("errors") or []
+    failed = [error for error in errors if error.get("type") in LIMIT_ERROR_TYPES or not error.get("path")]
+    if not failed and not response.get("data"):
+        failed = errors or [{"message": "Empty response"}]
+    return failed
+
+
+def split_batch_response(repos, response):
+    """
+    Split an aliased response back into one result per repository
+    Returns a list of (node, errors) in the order of repos
+    """
+    data = response.get("data") or {}
+    errors_by_alias = {}
+    for error in response.get("errors") or []:
+        path = error.get("path") or [None]
+        errors_by_alias.setdefault(path[0], []).append(error)
+
+    results = []
+    for index in range(len(repos)):
+        alias = repo_alias(index)
+        # Errors without a path concern the whole query
+        errors = errors_by_alias.get(alias, []) + errors_by_alias.get(None, [])
+        results.append((data.get(alias), errors))
+    return results
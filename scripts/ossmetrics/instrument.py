@@ -0,0 +1,284 @@
+import bisect
+import json
+import threading
+import time
+
+# Upper bounds of the buckets of the histograms of seconds
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Upper bounds of the buckets of the histograms of sizes, e.g. items per page
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+# Prefix of the metrics in the Prometheus text format
+PROMETHEUS_PREFIX = "ossmetrics_"
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise Exception("Expected the labels {0}, got {1}".format(list(labelnames), sorted(labels)))
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+class Metric(object):
+    """
+    Values of a metric by labels, updated by any thread
+    """
+
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """
+        Returns the (labels, value) pairs, sorted by labels
+        """
+        with self._lock:
+            items = sorted(self.values.items())
+        return [(dict(zip(self.labelnames, key)), self._export(value)) for key, value in items]
+
+    def _export(self, value):
+        return value
+
+    def merge(self, labels, value):
+        """
+        Add a value exported by another process
+        """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def merge(self, labels, value):
+        self.inc(value, **labels)
+
+
+class Gauge(Metric):
+    """
+    Last value set, or with add_up the sum of the values of the processes
+    merged, e.g. for what every process of a sharded fetch counted
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, description, labelnames=(), add_up=False):
+        Metric.__init__(self, name, description, labelnames)
+        self.add_up = add_up
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = value
+
+    def merge(self, labels, value):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value if self.add_up else value
+
+
+class Histogram(Metric):
+    """
+    Count of the observations by bucket, with their sum, min and max
+
+    Only the buckets are kept, not the observations, so the percentiles
+    of the report are interpolated within the buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=SECONDS_BUCKETS):
+        Metric.__init__(self, name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0,
+                                            "min": value, "max": value}
+            state["counts"][index] += 1
+            state["sum"] += value
+            state["min"] = min(state["min"], value)
+            state["max"] = max(state["max"], value)
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def merge(self, labels, value):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0,
+                                            "min": value["min"], "max": value["max"]}
+            for index, (_, count) in enumerate(value["buckets"]):
+                state["counts"][index] += count
+            state["sum"] += value["sum"]
+            state["min"] = min(state["min"], value["min"])
+            state["max"] = max(state["max"], value["max"])
+
+    def percentile(self, state, fraction):
+        total = sum(state["counts"])
+        rank = fraction * total
+        seen = 0
+        for index, count in enumerate(state["counts"]):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else state["min"]
+                upper = self.buckets[index] if index < len(self.buckets) else state["max"]
+                lower, upper = max(lower, state["min"]), min(upper, state["max"])
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return state["max"]
+
+    def _export(self, state):
+        return {
+            "count": sum(state["counts"]),
+            "sum": round(state["sum"], 6),
+            "min": state["min"],
+            "max": state["max"],
+            "p50": round(self.percentile(state, 0.5), 6),
+            "p90": round(self.percentile(state, 0.9), 6),
+            "p99": round(self.percentile(state, 0.99), 6),
+            # (upper bound, count) pairs, in order
+            "buckets": list(zip([str(bound) for bound in self.buckets] + ["+Inf"], state["counts"])),
+        }
+
+
+class Timer(object):
+    """
+    Observe the seconds spent in a with block
+    """
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.monotonic() - self.started, **self.labels)
+
+
+class Registry(object):
+    """
+    The metrics of the process, written as a run report at the end of a run
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def reset(self):
+        """
+        Forget the values, e.g. those a worker process inherited from its parent
+        """
+        for metric in self.metrics:
+            with metric._lock:
+                metric.values = {}
+
+    def merge(self, metrics):
+        """
+        Add the metrics of another process, as returned by its to_dict
+        Those not registered in this process are left out.
+        """
+        by_name = dict((metric.name, metric) for metric in self.metrics)
+        for name, data in metrics.items():
+            if name in by_name:
+                for sample in data["values"]:
+                    by_name[name].merge(sample["labels"], sample["value"])
+
+    def to_dict(self):
+        return dict((metric.name, {
+            "type": metric.kind,
+            "help": metric.description,
+            "values": [{"labels": labels, "value": value} for labels, value in metric.samples()],
+        }) for metric in self.metrics)
+
+    def to_prometheus(self):
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            name = PROMETHEUS_PREFIX + metric.name
+            lines.append("# HELP {0} {1}".format(name, metric.description))
+            lines.append("# TYPE {0} {1}".format(name, metric.kind))
+            for labels, value in metric.samples():
+                if metric.kind != "histogram":
+                    lines.append("{0}{1} {2}".format(name, _prometheus_labels(labels), value))
+                    continue
+                cumulative = 0
+                for bound, count in value["buckets"]:
+                    cumulative += count
+                    lines.append("{0}_bucket{1} {2}".format(
+                        name, _prometheus_labels(dict(labels, le=bound)), cumulative))
+                lines.append("{0}_sum{1} {2}".format(name, _prometheus_labels(labels), value["sum"]))
+                lines.append("{0}_count{1} {2}".format(name, _prometheus_labels(labels), value["count"]))
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for name, value in sorted(labels.items())) + "}"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, description, labelnames=()):
+    return REGISTRY.register(Counter(name, description, labelnames))
+
+
+def gauge(name, description, labelnames=(), add_up=False):
+    return REGISTRY.register(Gauge(name, description, labelnames, add_up))
+
+
+def histogram(name, description, labelnames=(), buckets=SECONDS_BUCKETS):
+    return REGISTRY.register(Histogram(name, description, labelnames, buckets))
+
+
+# Files are read and written by most stages, counted here by kind of file
+FILES_READ = counter("files_read_total", "Files read", ("kind",))
+FILES_WRITTEN = counter("files_written_total", "Files written", ("kind",))
+BYTES_WRITTEN = counter("bytes_written_total", "Bytes written to files", ("kind",))
+
+
+def file_written(kind, size):
+    FILES_WRITTEN.inc(kind=kind)
+    BYTES_WRITTEN.inc(size, kind=kind)
+
+
+def write_report(file_path, run, prometheus_path=None):
+    """
+    Write the metrics of the run as JSON to file_path, and in the
+    Prometheus text format to prometheus_path if given
+    run holds what describes the run as a whole, e.g. its stages
+    """
+    report = dict(run)
+    report["metrics"] = REGISTRY.to_dict()
+    with open(file_path, "w+") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print("LOG: Run report saved to", file_path)
+    if prometheus_path:
+        with open(prometheus_path, "w+") as f:
+            f.write(REGISTRY.to_prometheus())
+        print("LOG: Prometheus metrics saved to", prometheus_path)
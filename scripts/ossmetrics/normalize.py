@@ -0,0 +1,121 @@
+import json
+import re
+import string
+
+from . import instrument
+from . import spool
+from . import stats_jobs
+from .records import RepoSnapshot
+
+PRINTABLE = set(string.printable)
+
+
+def normalize_repository(node):
+    """
+    Project a repository node of the GraphQL response to a RepoSnapshot
+    """
+    # Flatten list of languages
+    languages_dict = {}
+    for item in node["languages"]["edges"]:
+        languages_dict[item["node"]["name"]] = item["size"]
+    total_bytes = sum(languages_dict.values())
+    for lang in languages_dict:
+        languages_dict[lang] /= total_bytes  # This is got to be a float, so use Python 3
+
+    # Use languages which have more than 5% code
+    languages = []
+    for item, value in languages_dict.items():
+        if value > 0.05:
+            languages.append(item)
+
+    # Flatten list of repository topics
+    topics = []
+    for item in node["repositoryTopics"]["edges"]:
+        topics.append(item["node"]["topic"]["name"])
+
+    commits = 0
+    default_branch = None
+    if node["defaultBranchRef"]:
+        commits = node["defaultBranchRef"]["target"]["history"]["totalCount"]
+        # As published before, without the HEAD the node carries for contributors.py
+        default_branch = {"target": {"history": {"totalCount": commits}}}
+
+    # descriptionHTML
+    des = ''.join(filter(lambda x: x in PRINTABLE, node["descriptionHTML"]))
+    description = re.sub(r'(<[^<+]+?>)|(\n)|(\t)', '', des)
+
+    snapshot = RepoSnapshot(
+        nameWithOwner=node["nameWithOwner"],
+        name=node["name"],
+        descriptionHTML=description,
+        homepageUrl=node["homepageUrl"],
+        isPrivate=node["isPrivate"],
+        repositoryTopics=" ".join(topics),
+        primaryLanguage=node["primaryLanguage"],
+        languages=" ".join(languages),
+        pushedAt=node["pushedAt"],
+        forkCount=node["forkCount"],
+        stargazers=node["stargazers"]["totalCount"],
+        watchers=node["watchers"]["totalCount"],
+        defaultBranchRef=default_branch,
+        pull_request=node["pull_request"]["totalCount"],
+        open_pull_request=node["open_pull_request"]["totalCount"],
+        merged_pull_request=node["merged_pull_request"]["totalCount"],
+        closed_pull_request=node["closed_pull_request"]["totalCount"],
+        issue=node["issue"]["totalCount"],
+        open_issue=node["open_issue"]["totalCount"],
+        closed_issue=node["closed_issue"]["totalCount"],
+        commits=commits,
+    )
+    snapshot.set_stats(stats_jobs.merge_summaries([]))
+    return snapshot
+
+
+class RepositoryStream(object):
+    """
+    Repositories of the last fetch, read back from the spool one at a time
+
+    Iterating yields (full name, RepoSnapshot) pairs in the order of the
+    plan, with the statistics of every repository; a repository listed
+    twice is only yielded the first time. It can be iterated as many times
+    as needed.
+    """
+
+    def __init__(self, spool_dir, sources, stats):
+        self.spool_dir = spool_dir
+        self.sources = sources
+        self.stats = stats
+
+    def __iter__(self):
+        seen = set()
+        for row in spool.read_spool(self.spool_dir, self.sources):
+            snapshot = RepoSnapshot.from_row(row)
+            if snapshot.nameWithOwner in seen:
+                continue
+            seen.add(snapshot.nameWithOwner)
+            if snapshot.nameWithOwner in self.stats:
+                snapshot.set_stats(self.stats[snapshot.nameWithOwner])
+            yield snapshot.nameWithOwner, snapshot
+
+
+class PublishedRepositories(object):
+    """
+    Repositories of projects.json, as (full name, RepoSnapshot) pairs
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def __iter__(self):
+        with open(self.file_path) as f:
+            repositories = json.load(f)
+        instrument.FILES_READ.inc(kind="data")
+        for repo_full_name, data in repositories.items():
+            yield repo_full_name, RepoSnapshot.from_dict(data)
+
+
+def normalize(config, fetched):
+    """
+    Repositories of the fetched data, keyed by their full name as in projects.json
+    """
+    return RepositoryStream(config.spool_dir, fetched["sources"], fetched["stats"])
@@ -0,0 +1,171 @@
+import errno
+import json
+import os
+import shutil
+
+from . import instrument
+
+JOURNAL_FILE = "commit.json"
+# Made once, json.dumps builds an encoder per call when given options
+_ENCODER = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+def dumps(data):
+    """
+    Compact JSON with the keys sorted, the same bytes for the same data
+    """
+    return _ENCODER.encode(data)
+
+
+def _move(source, target):
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # The staging directory is on another file system
+        shutil.copyfile(source, target + ".tmp")
+        os.replace(target + ".tmp", target)
+        os.remove(source)
+
+
+class OutputTransaction(object):
+    """
+    Stage the files of the site written by a run and move them into place together
+
+    The files of _data, metrics and assets are written whole to the staging
+    directory, and the files to delete are only noted. commit() lists them
+    in a journal, then renames every staged file over its target, which is
+    atomic, and deletes the noted ones. A run
+    killed before its commit leaves the previous outputs untouched, and the
+    commit of a run killed while committing is completed from the journal
+    by the next one.
+    """
+
+    def __init__(self, staging_dir):
+        self.staging_dir = staging_dir
+        self.files_dir = os.path.join(staging_dir, "files")
+        self.journal_path = os.path.join(staging_dir, JOURNAL_FILE)
+        # Absolute target path -> staged file
+        self.staged = {}
+        # Absolute path to delete -> directory up to which its empty parents go, or None
+        self.removed = {}
+        if os.path.exists(self.journal_path):
+            print("LOG: Completing the commit of the outputs of the last run")
+            with open(self.journal_path) as f:
+                self._apply(json.load(f))
+        # Left by a run which did not commit
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+
+    def path(self, file_path):
+        """
+        Where the content of file_path written by this run is, file_path if not written
+        """
+        return self.staged.get(os.path.abspath(file_path), file_path)
+
+    def exists(self, file_path):
+        key = os.path.abspath(file_path)
+        if key in self.removed:
+            return False
+        return key in self.staged or os.path.exists(file_path)
+
+    def listdir(self, directory):
+        """
+        Names in directory once this run is committed
+        """
+        names = set(os.listdir(directory)) if os.path.isdir(directory) else set()
+        directory = os.path.abspath(directory)
+        for key in self.staged:
+            if os.path.dirname(key) == directory:
+                names.add(os.path.basename(key))
+        for key in self.removed:
+            if os.path.dirname(key) == directory:
+                names.discard(os.path.basename(key))
+        return sorted(names)
+
+    def open(self, file_path):
+        """
+        Returns a file to write the new content of file_path to
+        """
+        key = os.path.abspath(file_path)
+        self.removed.pop(key, None)
+        staged = self.staged.get(key)
+        if staged is None:
+            if not os.path.exists(self.files_dir):
+                os.makedirs(self.files_dir)
+            staged = os.path.join(self.files_dir, "{0}-{1}".format(len(self.staged), os.path.basename(key)))
+            self.staged[key] = staged
+        return open(staged, "w")
+
+    def write(self, file_path, content, kind):
+        """
+        Write the text of a file, returns its size
+        """
+        with self.open(file_path) as f:
+            f.write(content)
+            size = f.tell()
+        instrument.file_written(kind, size)
+        return size
+
+    def write_json(self, file_path, data, kind):
+        return self.write(file_path, dumps(data), kind)
+
+    def remove(self, file_path, root=None):
+        """
+        Delete a file, and its parent directories left empty below root if given
+        """
+        key = os.path.abspath(file_path)
+        staged = self.staged.pop(key, None)
+        if staged is not None:
+            os.remove(staged)
+        self.removed[key] = os.path.abspath(root) if root else None
+
+    def commit(self):
+        """
+        Move the staged files into place and delete the removed ones
+        """
+        if not self.staged and not self.removed:
+            return
+        journal = {"staged": sorted(self.staged.items()), "removed": sorted(self.removed.items())}
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w+") as f:
+            json.dump(journal, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        self._apply(journal)
+        shutil.rmtree(self.staging_dir)
+        print("LOG: Outputs committed:", len(self.staged), "written,", len(self.removed), "deleted")
+        self.staged = {}
+        self.removed = {}
+
+    def _apply(self, journal):
+        directories = set()
+        for target, staged in journal["staged"]:
+            if not os.path.exists(staged):
+                # Moved already by the commit which was interrupted
+                continue
+            directory = os.path.dirname(target)
+            if directory not in directories:
+                if not os.path.exists(directory):
+                    os.makedirs(directory)
+                directories.add(directory)
+            _move(staged, target)
+        for target, root in journal["removed"]:
+            if os.path.exists(target):
+                os.remove(target)
+            directory = os.path.dirname(target)
+            while root and directory.startswith(root + os.sep) and os.path.isdir(directory) \
+                    and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+
+    def abort(self):
+        """
+        Drop what this run staged
+        """
+        if os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+        self.staged = {}
+        self.removed = {}
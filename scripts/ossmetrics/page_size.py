@@ -0,0 +1,64 @@
+import threading
+
+# Seconds a page should take; GitHub aborts the queries running for about 10
+TARGET_SECONDS = 4.0
+# Above this a response is slow to transfer and to decode
+MAX_PAGE_BYTES = 4 * 1024 * 1024
+# Seconds before a query is abandoned and retried as a smaller page
+QUERY_TIMEOUT = 30
+# Good pages in a row before growing back past a size that failed
+PATIENCE = 5
+
+
+class AdaptivePageSize(object):
+    """
+    Number of items to ask for in the next page of a paginated query
+
+    After a failed page (a timeout, a resource limit of GitHub or a partial
+    result) the size is halved and the page is asked again, from the same
+    cursor. After each good page the size moves toward the number of items
+    which would take target_seconds and stay under max_bytes, doubling at
+    most. The size which failed is not reached again before patience good
+    pages in a row. Shared by the threads paging the same kind of query.
+    """
+
+    def __init__(self, size, minimum=1, maximum=100, target_seconds=TARGET_SECONDS,
+                 max_bytes=MAX_PAGE_BYTES, patience=PATIENCE):
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.patience = patience
+        self.ceiling = maximum
+        self.good_pages = 0
+        self._lock = threading.Lock()
+
+    def observe(self, count, seconds, size_bytes):
+        """
+        Adjust the size after a page of count items which took seconds and size_bytes
+        A page smaller than the size, e.g. the last one, is left out: its
+        fixed costs weigh more and it would shrink the size for nothing
+        """
+        with self._lock:
+            if not count or count < self.size:
+                return
+            self.good_pages += 1
+            if self.good_pages >= self.patience:
+                self.ceiling = self.maximum
+            fits = min(self.target_seconds * count / max(seconds, 0.001),
+                       self.max_bytes * count / max(size_bytes, 1))
+            self.size = max(self.minimum, min(int(fits), self.size * 2, self.ceiling))
+
+    def shrink(self, failed_size):
+        """
+        Halve the size after a page of failed_size items failed
+        Returns False when the size is already at its minimum
+        """
+        with self._lock:
+            if failed_size <= self.minimum:
+                return False
+            self.good_pages = 0
+            self.ceiling = max(self.minimum, failed_size - 1)
+            self.size = max(self.minimum, min(self.size, failed_size // 2))
+            return True
@@ -0,0 +1,108 @@
+import json
+
+from . import instrument
+from . import output as output_writer
+from . import rollup
+
+# Sketch of the contributors of a repository, kept in its daily snapshots only
+SKETCH_KEY = "contributorSketch"
+# Values of a snapshot not carried into the periods
+NOT_ROLLED_UP = ("current_date", "previous_date", SKETCH_KEY)
+
+
+def series_name(owner, repo=None, period="weekly"):
+    """
+    e.g. DAI-Lab__SDGym_weekly for a repository, DAI-Lab_weekly for an organization
+    """
+    if repo is None:
+        return owner + "_" + period
+    return owner + "__" + repo + "_" + period
+
+
+def append_snapshot(history, series, date_str, metrics):
+    snapshot = {
+        "current_date": date_str,
+        # The snapshot of the same day is replaced when a day is run again
+        "previous_date": history.date_before(series, date_str) or date_str,
+    }
+    snapshot.update(metrics)
+    history.append(series, date_str, snapshot)
+
+
+def record_snapshot(history, owner, repo, date_str, metrics, closing, sketch=None):
+    """
+    Add the daily snapshot of a repository, or of an organization when
+    repo is None, and roll it up into the periods closing today
+
+    A period takes its newest daily snapshot; one without any, when the
+    job did not run during it, keeps the values of the period before.
+    The daily snapshot of a repository keeps the sketch of its
+    contributors, the last one when sketch is not given.
+    """
+    daily = series_name(owner, repo, rollup.DAILY)
+    if repo is not None and sketch is None:
+        last = history.value_at(daily, date_str)
+        sketch = last.get(SKETCH_KEY) if last else None
+    if sketch is not None:
+        metrics = dict(metrics)
+        metrics[SKETCH_KEY] = sketch
+    history.append(daily, date_str, metrics, export=False)
+    for period, dates in closing.items():
+        series = series_name(owner, repo, period)
+        for bucket in dates:
+            values = history.value_at(daily, bucket)
+            if values is None:
+                values = history.value_at(series, bucket)
+                if values is None:
+                    continue
+            values = dict((key, value) for key, value in values.items() if key not in NOT_ROLLED_UP)
+            append_snapshot(history, series, bucket, values)
+
+
+def write_json(output, file_path, data):
+    output.write_json(file_path, data, "data")
+    print("LOG: Saved to", file_path)
+
+
+def persist(config, repositories, summary, history, output):
+    """
+    Save the repositories and the summary to the data directory, add
+    today's snapshot of every repository and organization and roll them up
+    into the weekly, monthly and quarterly series
+
+    The repositories are (full name, RepoSnapshot) pairs, written to
+    projects.json one at a time. The files are staged in output, as compact
+    JSON with sorted keys, except the repositories of projects.json which
+    stay in the order of the plan, the order of the home page.
+    """
+    date_str = config.date_str
+    closing = rollup.start_run(history, date_str, summary["organization_metrics"])
+
+    file_path = config.data_path("projects.json")
+    count = 0
+    with output.open(file_path) as f:
+        f.write("{")
+        for repo, snapshot in repositories:
+            if count:
+                f.write(",")
+            f.write(json.dumps(repo) + ":" + output_writer.dumps(snapshot.to_dict()))
+            count += 1
+
+            owner, name = repo.split("/")
+            record_snapshot(history, owner, name, date_str, snapshot.metrics(), closing, snapshot.contributor_sketch)
+        f.write("}")
+        instrument.file_written("data", f.tell())
+    print("LOG: Saved to", file_path)
+    print("LOG: Number of public repos", count)
+
+    write_json(output, config.data_path("statistics.json"), summary["statistics"])
+    write_json(output, config.data_path("categories.json"), summary["categories"])
+
+    for organizationName, metrics in summary["organization_metrics"].items():
+        record_snapshot(history, organizationName, None, date_str, metrics, closing)
+
+    # Only the daily snapshots periods still open may need are kept
+    print("LOG: Daily snapshots pruned:", history.prune("_" + rollup.DAILY, rollup.oldest_closed(history)))
+
+    # Export the series updated by this run to the data directory
+    print("LOG: History files exported:", history.export_dirty())
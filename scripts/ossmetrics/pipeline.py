@@ -0,0 +1,231 @@
+import json
+import os
+import time
+
+from . import aggregate
+from . import bundles
+from . import instrument
+from . import normalize
+from . import output
+from . import persist
+from . import plan
+from . import render
+from . import rollup
+from . import stage_report
+from . import timeseries
+
+STAGES = ("plan", "fetch", "normalize", "aggregate", "persist", "render")
+# The fetch replaced by the data archived on the day of the run
+REBUILD_STAGES = ("rebuild", "normalize", "aggregate", "persist", "render")
+# A node of a multi-node run only fetches its shard, into its bundle
+SHARD_STAGES = ("plan", "fetch")
+# The fetch replaced by the bundles of every node
+MERGE_STAGES = ("merge", "normalize", "aggregate", "persist", "render")
+ORDER = ("plan", "fetch", "rebuild", "merge", "normalize", "aggregate", "persist", "render")
+
+# Data handed from a stage to the next ones, saved to the state directory
+# so a later run can start from there. The repositories themselves stay in
+# the spool of the fetch stage, the summary is kept for the runs rendering
+# the pages alone, and aggregated again when missing.
+ARTIFACTS = {
+    "fetched": ("fetch", "rebuild", "merge"),
+    "summary": ("aggregate",),
+}
+
+
+class Pipeline(object):
+    """
+    Run any subset of the stages, in order
+
+    A stage whose input was not produced in the same run reads it from the
+    state directory, or from the published data when nothing was fetched,
+    so the pages can be generated again without fetching anything. Only
+    the fetch stage imports the HTTP client.
+
+    The repositories flow from one stage to the next as a stream read
+    from the spool, never as a whole in memory. The files of the site are
+    staged until every stage succeeded, then committed together, and the
+    history store right after them: a run failing before leaves both as
+    they were. A run killed in between has its files completed from the
+    journal by the next one, which closes the same periods again.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.client = None
+        # Requests sent by the worker processes of a sharded fetch
+        self.shard_requests = 0
+        self.data = {}
+        self._plan = None
+        self._history = None
+        self._output = None
+        self.stages = stage_report.StageRecorder(config.stage_report, self.request_count)
+        self.profiler = None
+        if config.profile_dir:
+            # Imported here so the runs without profiling do not even load it
+            from . import profiling
+            self.profiler = profiling.StageProfiler(config.profile_dir)
+
+    def request_count(self):
+        return self.shard_requests + (self.client.request_count if self.client is not None else 0)
+
+    def _state_path(self, name):
+        return os.path.join(self.config.state_dir, name + ".json")
+
+    def load(self, name):
+        if name not in self.data:
+            file_path = self._state_path(name)
+            if not os.path.exists(file_path) and name == "summary":
+                # E.g. render alone on a fresh checkout, the same as running aggregate first
+                print("LOG: No summary data in", self.config.state_dir, "aggregating the repositories again")
+                self.run_aggregate()
+                return self.data[name]
+            if not os.path.exists(file_path):
+                raise Exception("No {0} data in {1}, run the {2} stage first".format(
+                    name, self.config.state_dir, ARTIFACTS[name][0]))
+            with open(file_path) as f:
+                self.data[name] = json.load(f)
+            instrument.FILES_READ.inc(kind="state")
+        return self.data[name]
+
+    def save(self, name):
+        if not os.path.exists(self.config.state_dir):
+            os.makedirs(self.config.state_dir)
+        with open(self._state_path(name), "w+") as f:
+            json.dump(self.data[name], f)
+            instrument.file_written("state", f.tell())
+
+    @property
+    def repositories(self):
+        """
+        The repositories normalized in this run, or else those of the last
+        fetch, or else the published ones
+        """
+        if "repositories" not in self.data:
+            if "fetched" in self.data or os.path.exists(self._state_path("fetched")):
+                self.data["repositories"] = normalize.normalize(self.config, self.load("fetched"))
+            else:
+                self.data["repositories"] = normalize.PublishedRepositories(
+                    self.config.data_path("projects.json"))
+        return self.data["repositories"]
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            self._plan = plan.plan()
+        return self._plan
+
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = timeseries.TimeSeriesStore(self.config.history_db, self.config.data_dir, self.output)
+        return self._history
+
+    @property
+    def output(self):
+        if self._output is None:
+            self._output = output.OutputTransaction(self.config.staging_dir)
+        return self._output
+
+    def run_plan(self):
+        self._plan = None
+        return self.plan
+
+    def run_fetch(self):
+        if self.config.processes > 1:
+            from . import shards
+            self.data["fetched"], self.shard_requests = shards.fetch(self.config, self.plan)
+        else:
+            # Imported here so the other stages run without the HTTP stack
+            from . import fetch
+            self.client = fetch.create_client(self.config)
+            self.data["fetched"] = fetch.fetch(self.config, self.plan, self.client)
+        if self.config.node_shard is not None:
+            bundles.write_bundle(self.config, self.plan, self.data["fetched"])
+
+    def run_rebuild(self):
+        from . import archive
+        response_archive = archive.ResponseArchive(self.config.archive_dir)
+        self._plan, self.data["fetched"] = archive.rebuild(self.config, response_archive)
+
+    def run_merge(self):
+        self._plan, self.data["fetched"] = bundles.merge(self.config, bundles.find_bundles(self.config.bundle_dir))
+
+    def run_normalize(self):
+        self.data["repositories"] = normalize.normalize(self.config, self.load("fetched"))
+
+    def run_aggregate(self):
+        # The members count comes with the fetched data, or from the last summary
+        if "fetched" in self.data or os.path.exists(self._state_path("fetched")):
+            members = self.load("fetched")["members"]
+        elif os.path.exists(self._state_path("summary")):
+            members = self.load("summary")["members"]
+        else:
+            members = None
+        self.data["summary"] = aggregate.aggregate(self.repositories, self.plan.orgs, members, self.stored_sketch)
+
+    def stored_sketch(self, repo):
+        """
+        Sketch of the contributors kept with the last daily snapshot of a repository
+        """
+        owner, name = repo.split("/")
+        values = self.history.value_at(persist.series_name(owner, name, rollup.DAILY), self.config.date_str)
+        return values.get(persist.SKETCH_KEY) if values else None
+
+    def run_persist(self):
+        persist.persist(self.config, self.repositories, self.load("summary"), self.history, self.output)
+
+    def run_render(self):
+        render.render(self.config, self.repositories, self.load("summary"), self.history, self.output)
+
+    def write_run_report(self, started, failed):
+        """
+        Metrics of the run, to follow its cost from one run to the next
+        """
+        directory = os.path.dirname(self.config.run_report)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        run = {
+            "date": self.config.date_str,
+            "started": started,
+            "seconds": round(time.time() - started, 4),
+            "stages": [dict((key, stage[key]) for key in ("name", "seconds", "requests", "peak_rss_kb"))
+                       for stage in self.stages.stages],
+            "failed": failed,
+        }
+        instrument.write_report(self.config.run_report, run, self.config.prometheus_report)
+
+    def run(self, stages=STAGES):
+        self.ran = []
+        started = time.time()
+        failed = True
+        try:
+            for name in ORDER:
+                if name in stages:
+                    self.stages.mark(name)
+                    if self.profiler is None:
+                        getattr(self, "run_" + name)()
+                    else:
+                        self.profiler.run(name, getattr(self, "run_" + name))
+                    self.ran.append(name)
+            for name, producers in ARTIFACTS.items():
+                if any(producer in self.ran for producer in producers):
+                    self.save(name)
+            if self._output is not None:
+                self._output.commit()
+            if self._history is not None:
+                # Once the files are in place, so the store never tells of files the site did not get
+                self._history.commit()
+            failed = False
+        finally:
+            if self._output is not None:
+                # Nothing of a failed run reaches the site
+                self._output.abort()
+                self._output = None
+            if self._history is not None:
+                # The periods closed by a failed run are closed again by the next one
+                self._history.close()
+                self._history = None
+            self.stages.finish()
+            if self.config.run_report:
+                self.write_run_report(started, failed)
@@ -0,0 +1,50 @@
+class Plan(object):
+    """
+    What to fetch: organizations tracked with all their repositories,
+    repositories tracked one by one and the repositories to leave out
+    """
+
+    def __init__(self, orgs, repos, exclude):
+        self.orgs = orgs  # e.g. DAI-Lab,..
+        self.repos = repos  # e.g. ('pantsbuild', 'pants')
+        self.exclude = exclude  # e.g. DAI-Lab/vagrant
+
+    def key(self, date_str):
+        """
+        What a run of date_str fetches, as JSON, to tell runs of the same plan apart
+        """
+        return {
+            "date": date_str,
+            "orgs": self.orgs,
+            "repos": [list(repo) for repo in self.repos],
+            "exclude": sorted(self.exclude),
+        }
+
+    @classmethod
+    def from_key(cls, key):
+        return cls(key["orgs"], [tuple(repo) for repo in key["repos"]], set(key["exclude"]))
+
+
+def plan(include_path="repos-to-include.txt", exclude_path="repos-to-exclude.txt"):
+    """
+    Read repos-to-include.txt and repos-to-exclude.txt
+    """
+    orgs = []
+    repos = []
+    with open(include_path, "r") as f:
+        for line in f:
+            owner, repo = line.split("/")
+            repo = repo.rstrip("\n")
+            if repo == "*":
+                orgs.append(owner)
+            else:
+                repos.append((owner, repo))
+
+    exclude = set()
+    with open(exclude_path, "r") as f:
+        for line in f:
+            exclude.add(line.rstrip("\n"))
+
+    print("LOG: Orgs to track", orgs)
+    print("Repos to track", repos)
+    return Plan(orgs, repos, exclude)
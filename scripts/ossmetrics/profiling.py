@@ -0,0 +1,79 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+
+# Functions and lines listed in the summary of each stage
+TOP = 25
+
+
+class StageProfiler(object):
+    """
+    Run each stage under cProfile and tracemalloc
+
+    For every stage, directory gets the CPU profile as NAME.pstats, to open
+    with pstats or snakeviz, and NAME.txt summarizing the functions taking
+    the most time and the lines holding the most memory at the end of the
+    stage. The threads started by a stage, e.g. the requests of the fetch,
+    are profiled too and merged into the profile of the stage.
+    """
+
+    def __init__(self, directory, top=TOP):
+        self.directory = directory
+        self.top = top
+        self._lock = threading.Lock()
+        self._thread_profiles = []
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _profile_thread(self, frame, event, arg):
+        profile = cProfile.Profile()
+        try:
+            # Replaces this hook for the rest of the thread
+            profile.enable()
+        except ValueError:
+            # Python 3.12 and later profile all the threads from the main one
+            return
+        with self._lock:
+            self._thread_profiles.append(profile)
+
+    def run(self, name, function):
+        self._thread_profiles = []
+        profile = cProfile.Profile()
+        tracemalloc.start()
+        threading.setprofile(self._profile_thread)
+        try:
+            return profile.runcall(function)
+        finally:
+            threading.setprofile(None)
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._save(name, profile, snapshot, peak)
+
+    def _save(self, name, profile, snapshot, peak):
+        stats = pstats.Stats(profile)
+        with self._lock:
+            for thread_profile in self._thread_profiles:
+                stats.add(thread_profile)
+        stats_path = os.path.join(self.directory, name + ".pstats")
+        stats.dump_stats(stats_path)
+
+        summary = io.StringIO()
+        summary.write("Stage {0}\n\n".format(name))
+        summary.write("Peak traced memory: {0:.1f} KiB\n\n".format(peak / 1024.0))
+        summary.write("Largest allocations alive at the end of the stage:\n")
+        for statistic in snapshot.statistics("lineno")[:self.top]:
+            summary.write("  {0}\n".format(statistic))
+        summary.write("\n")
+        stats.stream = summary
+        for sort_key in ("cumulative", "tottime"):
+            summary.write("Functions by {0} time:\n".format(sort_key))
+            stats.sort_stats(sort_key).print_stats(self.top)
+
+        summary_path = os.path.join(self.directory, name + ".txt")
+        with open(summary_path, "w+") as f:
+            f.write(summary.getvalue())
+        print("LOG: Profile of", name, "saved to", stats_path, "and", summary_path)
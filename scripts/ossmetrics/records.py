@@ -0,0 +1,101 @@
+import operator
+
+# Metrics of the history of a repository or an organization, and the
+# field of the repository data each of them is read from
+METRIC_FIELDS = [
+    ("commitCount", "commits"),
+    ("issueCount", "issue"),
+    ("openIssueCount", "open_issue"),
+    ("closedIssueCount", "closed_issue"),
+    ("pullRequestCount", "pull_request"),
+    ("openPullRequestCount", "open_pull_request"),
+    ("mergedPullRequestCount", "merged_pull_request"),
+    ("closedPullRequestCount", "closed_pull_request"),
+    ("forkCount", "forkCount"),
+    ("starCount", "stargazers"),
+    ("watcherCount", "watchers"),
+]
+METRIC_KEYS = [metric for metric, _ in METRIC_FIELDS]
+
+# Fields of projects.json, in the order they are written
+SNAPSHOT_FIELDS = (
+    "nameWithOwner",
+    "name",
+    "descriptionHTML",
+    "homepageUrl",
+    "isPrivate",
+    "repositoryTopics",
+    "primaryLanguage",
+    "languages",
+    "pushedAt",
+    "forkCount",
+    "stargazers",
+    "watchers",
+    "defaultBranchRef",
+    "pull_request",
+    "open_pull_request",
+    "merged_pull_request",
+    "closed_pull_request",
+    "issue",
+    "open_issue",
+    "closed_issue",
+    "commits",
+    # Summary of the /stats endpoints and of the commit authors, see stats_jobs.SUMMARY_FIELDS
+    "contributors",
+    "commits_last_year",
+    "additions",
+    "deletions",
+    "participation_all",
+    "participation_owner",
+)
+
+_snapshot_values = operator.attrgetter(*SNAPSHOT_FIELDS)
+_metric_values = operator.attrgetter(*[field for _, field in METRIC_FIELDS])
+
+
+class RepoSnapshot(object):
+    """
+    Data of one repository on the day of the run, as published in projects.json
+
+    Only the fields we publish are kept, in a fixed order, so a snapshot
+    is a compact row rather than the nested GraphQL response. The sketch
+    of the contributors, set with the statistics, is not published.
+    """
+
+    __slots__ = SNAPSHOT_FIELDS + ("contributor_sketch",)
+
+    def __init__(self, **fields):
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, fields.get(field))
+        self.contributor_sketch = None
+
+    @classmethod
+    def from_row(cls, row):
+        snapshot = cls.__new__(cls)
+        for field, value in zip(SNAPSHOT_FIELDS, row):
+            setattr(snapshot, field, value)
+        snapshot.contributor_sketch = None
+        return snapshot
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_row(self):
+        return list(_snapshot_values(self))
+
+    def to_dict(self):
+        return dict(zip(SNAPSHOT_FIELDS, _snapshot_values(self)))
+
+    def set_stats(self, summary):
+        for field, value in summary.items():
+            setattr(self, field, value)
+
+    def metric_values(self):
+        """
+        Values of the history metrics, in the order of METRIC_FIELDS
+        """
+        return _metric_values(self)
+
+    def metrics(self):
+        return dict(zip(METRIC_KEYS, self.metric_values()))
@@ -0,0 +1,281 @@
+import os
+import re
+
+from . import instrument
+from . import report_views
+from . import rollup
+from . import site_stubs
+from .aggregate import group_by_owner
+from .persist import series_name
+
+URL_METRICS = "/metrics"
+
+# Report pages, e.g. DAI-Lab/SDGym/WEEKLY-REPORT-2020-01-05.md
+REPORT_PAGE = re.compile(r"^(WEEKLY|MONTHLY)-REPORT-(\d{4}-\d{2}-\d{2})\.md$")
+
+
+def update_network_svg(output, members, repositories_count, raw_path="assets/network_raw.svg",
+                       path="assets/network.svg"):
+    print("No of members", members)
+    print("No of repos", repositories_count)
+    network_svg = open(raw_path).read()
+    network_svg = network_svg.replace("{$members}", str(members))
+    network_svg = network_svg.replace("{$Repos}", str(repositories_count))
+    instrument.FILES_READ.inc(kind="site")
+    output.write(path, network_svg, "site")
+    print("LOG: " + path + " updated!")
+
+
+class Renderer(object):
+    """
+    Generate the Jekyll stubs of the metrics pages and the data of their reports
+    """
+
+    def __init__(self, config, names, history, output):
+        self.config = config
+        # Full name -> name of every repository
+        self.names = names
+        self.repos_by_owner = group_by_owner(names)
+        self.history = history
+        # Stubs are only written when their content changed
+        self.stubs = site_stubs.StubWriter(config.metrics_dir, output)
+        # Data of each report page, read by the layouts
+        self.reports = report_views.ReportWriter(history, config.data_dir, output)
+
+    def write_template_file(self, file_path, layout, permalink, title, options={}):
+        self.stubs.write(file_path, layout, permalink, title, options)
+
+    def organization_repo_series(self, cate, period):
+        """
+        (repository name, series) of the repositories listed in an organization report
+        """
+        repo_series = []
+        for repo in self.repos_by_owner.get(cate, []):
+            name = self.names[repo]
+            if name != cate:
+                repo_series.append((name, series_name(cate, name, period)))
+        return repo_series
+
+    # Create template for repository weekly
+    def create_template_repository_weekly(self, cate, subCate, now_str):
+        organization_folder_path = self.config.metrics_dir + "/" + cate + "/" + subCate
+        # Index page
+        organization_path = organization_folder_path + "/index.md"
+        layout = "repository"
+        permalink = URL_METRICS + "/" + cate + "/" + subCate + "/"
+        title = "DAI Lab OSS Metrics Metrics report for " + subCate
+        options = {"organization": cate, "repository": subCate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+        # WEEKLY page
+        organization_path = organization_folder_path + "/WEEKLY.md"
+        layout = "weekly"
+        permalink = URL_METRICS + "/" + cate + "/" + subCate + "/WEEKLY" + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ subCate +" | WEEKLY-REPORT-" + now_str
+        options = {"organization": cate, "repository": subCate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+
+        # WEEKLY DATE page
+        organization_path = organization_folder_path + "/WEEKLY-REPORT-"+ now_str +".md"
+        layout = "weekly"
+        permalink = URL_METRICS + "/" + cate + "/" + subCate + "/WEEKLY-REPORT-"+ now_str
+        title = "DAI Lab OSS Metrics Metrics report for "+ subCate +" | WEEKLY-REPORT-" + now_str
+        options = {"organization": cate, "repository": subCate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+        self.reports.write(series_name(cate, subCate, "weekly"), now_str)
+
+    # Create template for organization weekly
+    def create_template_organization_weekly(self, cate, now_str):
+        organization_folder_path = self.config.metrics_dir + "/" + cate
+        # Index page
+        organization_path = organization_folder_path + "/index.md"
+        layout = "organization"
+        permalink = URL_METRICS + "/" + cate + "/"
+        title = "Index"
+        options = {"organization": cate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+        # WEEKLY page
+        organization_path = organization_folder_path + "/WEEKLY.md"
+        layout = "organization_weekly"
+        permalink = URL_METRICS + "/" + cate + "/WEEKLY" + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ cate +" | WEEKLY-REPORT-" + now_str
+        options = {"organization": cate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+
+        # WEEKLY DATE page
+        organization_path = organization_folder_path + "/WEEKLY-REPORT-"+ now_str +".md"
+        layout = "organization_weekly"
+        permalink = URL_METRICS + "/" + cate + "/WEEKLY-REPORT-"+ now_str + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ cate +" | WEEKLY-REPORT-" + now_str
+        options = {"organization": cate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+        self.reports.write(series_name(cate, period="weekly"), now_str, self.organization_repo_series(cate, "weekly"))
+
+    # Create template repository monthly
+    def create_template_repository_monthly(self, cate, subCate, now_str):
+        organization_folder_path = self.config.metrics_dir + "/" + cate + "/" + subCate
+        # Index page
+        organization_path = organization_folder_path + "/index.md"
+        layout = "repository"
+        permalink = URL_METRICS + "/" + cate + "/" + subCate + "/"
+        title = "DAI Lab OSS Metrics Metrics report for " + subCate
+        options = {"organization": cate, "repository": subCate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+
+        # MONTHLY page
+        organization_path = organization_folder_path + "/MONTHLY.md"
+        layout = "monthly"
+        permalink = URL_METRICS + "/" + cate + "/" + subCate + "/MONTHLY" + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ subCate +" | MONTHLY-REPORT-" + now_str
+        options = {"organization": cate, "repository": subCate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+
+        # MONTHLY DATE page
+        organization_path = organization_folder_path + "/MONTHLY-REPORT-"+ now_str +".md"
+        layout = "monthly"
+        permalink = URL_METRICS + "/" + cate + "/" + subCate + "/MONTHLY-REPORT-"+ now_str + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ subCate +" | MONTHLY-REPORT-" + now_str
+        options = {"organization": cate, "repository": subCate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+        self.reports.write(series_name(cate, subCate, "monthly"), now_str)
+
+    # Create template organization monthly
+    def create_template_organization_monthly(self, cate, now_str):
+        organization_folder_path = self.config.metrics_dir + "/" + cate
+        # Index page
+        organization_path = organization_folder_path + "/index.md"
+        layout = "organization"
+        permalink = URL_METRICS + "/" + cate + "/"
+        title = "Index"
+        options = {"organization": cate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+
+        # MONTHLY page
+        organization_path = organization_folder_path + "/MONTHLY.md"
+        layout = "organization_monthly"
+        permalink = URL_METRICS + "/" + cate + "/MONTHLY" + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ cate +" | MONTHLY-REPORT-" + now_str
+        options = {"organization": cate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+
+        # MONTHLY DATE page
+        organization_path = organization_folder_path + "/MONTHLY-REPORT-"+ now_str +".md"
+        layout = "organization_monthly"
+        permalink = URL_METRICS + "/" + cate + "/MONTHLY-REPORT-"+ now_str + "/"
+        title = "DAI Lab OSS Metrics Metrics report for "+ cate +" | MONTHLY-REPORT-" + now_str
+        options = {"organization": cate, "current_date": now_str}
+        self.write_template_file(organization_path, layout, permalink, title, options)
+        self.reports.write(series_name(cate, period="monthly"), now_str, self.organization_repo_series(cate, "monthly"))
+
+    def render_pages(self, categories, closing):
+        """
+        Pages of the tracked organizations and repositories for the periods
+        closed by this run, {period: [date_str]}, dated by their boundary
+        The repositories tracked on their own, whose organization is not,
+        get their pages too. An organization or repository seen for the
+        first time gets its pages dated today, so its links work before its
+        first period closes. Quarterly periods are only published as data,
+        they have no layout.
+        """
+        organization_pages = {
+            "weekly": self.create_template_organization_weekly,
+            "monthly": self.create_template_organization_monthly,
+        }
+        repository_pages = {
+            "weekly": self.create_template_repository_weekly,
+            "monthly": self.create_template_repository_monthly,
+        }
+
+        organizations = set(cate for listCate in categories for cate in listCate)
+        individual_repos = sorted(repo for repo in self.names if repo.split("/")[0] not in organizations)
+
+        for period in ("weekly", "monthly"):
+            for now_str in closing[period]:
+                # Not for a period closed before the organization or repository was first seen
+                for listCate in categories:
+                    for cate in listCate:
+                        if self.history.get(series_name(cate, period=period), now_str) is not None:
+                            organization_pages[period](cate, now_str)
+                        #Generate template for sub-categories
+                        for subCate in listCate[cate]:
+                            if self.history.get(series_name(cate, subCate, period), now_str) is not None:
+                                repository_pages[period](cate, subCate, now_str)
+                for repo in individual_repos:
+                    owner, name = repo.split("/")[0], self.names[repo]
+                    if self.history.get(series_name(owner, name, period), now_str) is not None:
+                        repository_pages[period](owner, name, now_str)
+
+        now_str = self.config.date_str
+        targets = []
+        for listCate in categories:
+            for cate in listCate:
+                targets.append((cate, None))
+                targets.extend((cate, subCate) for subCate in listCate[cate])
+        targets.extend((repo.split("/")[0], self.names[repo]) for repo in individual_repos)
+        for period in ("weekly", "monthly"):
+            for owner, name in targets:
+                values = self.first_values(owner, name, period, now_str)
+                if values is None:
+                    continue
+                if name is None:
+                    organization_pages[period](owner, now_str)
+                else:
+                    repository_pages[period](owner, name, now_str)
+                self.reports.write_first(series_name(owner, name, period), now_str, values)
+
+    def first_values(self, owner, name, period, now_str):
+        """
+        Snapshot of the day of an organization, or of a repository if name
+        is given, seen for the first time today and without any period yet,
+        else None
+        """
+        daily = series_name(owner, name, rollup.DAILY)
+        if self.history.date_before(daily, now_str) is not None:
+            return None
+        if self.history.value_at(series_name(owner, name, period), now_str) is not None:
+            return None
+        return self.history.get(daily, now_str)
+
+    def backfill_reports(self):
+        """
+        Precompute the reports of the pages generated before the reports existed
+        """
+        existing_reports = self.reports.existing()
+        for page_path in self.stubs.pages():
+            parts = page_path.split(os.sep)
+            match = REPORT_PAGE.match(parts[-1])
+            if not match:
+                continue
+            period, date = match.group(1).lower(), match.group(2)
+            if len(parts) == 3:
+                series = series_name(parts[0], parts[1], period)
+                repo_series = None
+            else:
+                series = series_name(parts[0], period=period)
+                repo_series = self.organization_repo_series(parts[0], period)
+            if report_views.report_name(series, date) not in existing_reports:
+                self.reports.write(series, date, repo_series)
+
+
+def render(config, repositories, summary, history, output):
+    """
+    Update the network picture and the metrics pages of the periods closed today
+    repositories are the (full name, RepoSnapshot) pairs of the repositories,
+    the files are staged in output
+    """
+    names = dict((repo, snapshot.name) for repo, snapshot in repositories)
+    if summary["members"]:
+        update_network_svg(output, summary["members"], len(names))
+    else:
+        # E.g. rendering alone from projects.json, which has no members count
+        print("LOG: Members count unknown, assets/network.svg left as it is")
+
+    renderer = Renderer(config, names, history, output)
+    renderer.render_pages(summary["categories"], rollup.closed_today(history, config.date_str))
+
+    # Remove the pages of the repositories no longer tracked, when asked to
+    renderer.stubs.prune(names, config.prune_pages)
+    renderer.stubs.save()
+    renderer.stubs.report()
+
+    renderer.backfill_reports()
+    print("LOG: Report data files written:", renderer.reports.written)
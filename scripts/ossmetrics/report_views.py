@@ -0,0 +1,134 @@
+import os
+
+# Metric key in the history, label and anchor id of its row in the reports
+REPORT_METRICS = [
+    ("commitCount", "Commits", "commits"),
+    ("issueCount", "Issues", "issues"),
+    ("openIssueCount", "Open Issues", "openIssues"),
+    ("closedIssueCount", "Closed Issues", "closedIssues"),
+    ("pullRequestCount", "Pull Requests", "pullRequests"),
+    ("openPullRequestCount", "Open Pull Requests", "openPullRequests"),
+    ("mergedPullRequestCount", "Merged Pull Requests", "mergedPullRequests"),
+    ("closedPullRequestCount", "Closed Pull Requests", "closedPullRequests"),
+    ("forkCount", "Forks", "forkCount"),
+    ("starCount", "Stars", "stargazers"),
+    ("watcherCount", "Watchers", "watchers"),
+]
+
+
+def report_name(series, date):
+    """
+    Name of the data file of a report, e.g. DAI-Lab__SDGym_weekly_2020-01-05
+    """
+    return series + "_" + date
+
+
+def metric_view(anchor, label, current, previous):
+    """
+    Row of a report, with the difference and its color computed
+    """
+    diff = current - previous
+    if diff == previous or diff < 0:
+        color = "color-red"
+    else:
+        color = "color-green"
+
+    if current == 0 and previous == 0:
+        percent = 0.0
+    elif previous == 0:
+        percent = None
+    else:
+        percent = round(diff * 100.0 / previous, 2)
+
+    return {
+        "id": anchor,
+        "label": label,
+        "current": current,
+        "previous": previous,
+        "diff": diff,
+        "percent": percent,
+        "color": color,
+    }
+
+
+class ReportWriter(object):
+    """
+    Precompute the data of each report page into _data/reports
+
+    A report holds the latest and previous values of every metric, their
+    difference and, for organizations, the repositories that changed. The
+    layouts read that single file instead of the whole history.
+    """
+
+    def __init__(self, history, data_dir, output):
+        self.history = history
+        self.output = output
+        self.directory = os.path.join(data_dir, "reports")
+        self.written = 0
+
+    def _snapshots(self, series, date):
+        """
+        Returns the snapshot of a date and the one it is compared with
+        """
+        current = self.history.get(series, date)
+        if current is None:
+            return None, None
+        previous = self.history.get(series, current["previous_date"]) or {}
+        return current, previous
+
+    def build(self, series, date, repo_series=None):
+        """
+        repo_series is the list of (repository name, series) of an organization
+        """
+        current, previous = self._snapshots(series, date)
+        if current is None:
+            return None
+        return self._view(current, previous, repo_series, date)
+
+    def _view(self, current, previous, repo_series, date):
+        repositories = {}
+        for name, series_repo in repo_series or []:
+            current_repo, previous_repo = self._snapshots(series_repo, date)
+            if current_repo is None:
+                continue
+            for metric, _, _ in REPORT_METRICS:
+                diff = current_repo[metric] - previous_repo.get(metric, 0)
+                if diff != 0:
+                    repositories.setdefault(metric, []).append({"name": name, "diff": diff})
+
+        metrics = []
+        for metric, label, anchor in REPORT_METRICS:
+            view = metric_view(anchor, label, current[metric], previous.get(metric, 0))
+            view["repositories"] = repositories.get(metric, [])
+            metrics.append(view)
+
+        return {
+            "current_date": current["current_date"],
+            "previous_date": current["previous_date"],
+            "metrics": metrics,
+        }
+
+    def write(self, series, date, repo_series=None):
+        self._write(series, date, self.build(series, date, repo_series))
+
+    def write_first(self, series, date, values):
+        """
+        Report of a repository or organization seen for the first time,
+        before any of its periods closed: its values of the day compared
+        with themselves, dated that day
+        """
+        current = dict(values, current_date=date, previous_date=date)
+        self._write(series, date, self._view(current, values, None, date))
+
+    def _write(self, series, date, view):
+        if view is None:
+            return
+        file_path = os.path.join(self.directory, report_name(series, date) + ".json")
+        self.output.write_json(file_path, view, "report")
+        self.written += 1
+
+    def existing(self):
+        """
+        Names of the reports already written
+        """
+        return set(os.path.splitext(name)[0] for name in self.output.listdir(self.directory))
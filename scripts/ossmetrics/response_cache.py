@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from . import instrument
+
+# Seconds a cached response is served without asking GitHub again.
+# Once expired, responses with an ETag are revalidated with If-None-Match,
+# which GitHub answers with a 304 that is not charged to the rate limit.
+DEFAULT_TTLS = {
+    "graphql": 6 * 3600,
+    "contributors": 12 * 3600,
+    "commit_activity": 12 * 3600,
+    "code_frequency": 12 * 3600,
+    "participation": 12 * 3600,
+}
+DEFAULT_TTL = 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+LOOKUPS = instrument.counter("cache_lookups_total", "Lookups of the response cache", ("outcome",))
+EVICTED = instrument.counter("cache_evicted_total", "Responses evicted from the response cache")
+
+
+def _mtime(file_path):
+    try:
+        return os.path.getmtime(file_path)
+    except OSError:
+        return 0
+
+
+def endpoint_name(path):
+    """
+    Name of the endpoint used to look up its TTL
+    e.g. /graphql -> graphql, /repos/DAI-Lab/SDGym/stats/contributors -> contributors
+    """
+    return path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def request_key(method, path, body=None):
+    """
+    Cache key of a request: method, URL and, for GraphQL, query text and variables
+    """
+    digest = hashlib.sha256()
+    digest.update(method.encode("utf-8"))
+    digest.update(path.encode("utf-8"))
+    if body is not None:
+        digest.update(json.dumps(body, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache(object):
+    """
+    Persistent cache of GitHub responses, one JSON file per request
+
+    Entries are {"stored_at", "etag", "body"}. The cache is bounded by
+    max_bytes: the least recently used files (by mtime, refreshed on
+    every hit) are evicted first.
+    """
+
+    def __init__(self, directory, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        # Polls of the /stats endpoints answered 202, their last poll is the hit or miss
+        self.pending = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        self._sizes = {}  # file path -> size in bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for root, _, files in os.walk(directory):
+            for name in files:
+                file_path = os.path.join(root, name)
+                self._sizes[file_path] = os.path.getsize(file_path)
+
+    def _file_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def ttl(self, path):
+        return self.ttls.get(endpoint_name(path), DEFAULT_TTL)
+
+    def get(self, key):
+        """
+        Returns the cached entry of a request, None if not cached
+        """
+        file_path = self._file_path(key)
+        try:
+            with open(file_path) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return None
+        instrument.FILES_READ.inc(kind="cache")
+        os.utime(file_path, None)
+        return entry
+
+    def is_fresh(self, entry, path):
+        return time.time() - entry["stored_at"] < self.ttl(path)
+
+    def put(self, key, body, etag=None):
+        file_path = self._file_path(key)
+        if not os.path.exists(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w+") as f:
+            json.dump({"stored_at": time.time(), "etag": etag, "body": body}, f)
+        with self._lock:
+            self._sizes[file_path] = os.path.getsize(file_path)
+        instrument.file_written("cache", self._sizes[file_path])
+        self._evict()
+
+    def refresh(self, key, entry):
+        """
+        Mark a revalidated entry as fresh again
+        """
+        self.put(key, entry["body"], entry.get("etag"))
+
+    def record(self, outcome):
+        """
+        Count a lookup, outcome is 'hit', 'miss', 'revalidated' or 'pending'
+        """
+        LOOKUPS.inc(outcome=outcome)
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            elif outcome == "pending":
+                self.pending += 1
+            else:
+                self.misses += 1
+
+    def _evict(self):
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            # Evict a little more than needed so it does not run on every put
+            target = self.max_bytes * 0.9
+            by_age = sorted(self._sizes, key=_mtime)
+            for file_path in by_age:
+                if total <= target:
+                    break
+                total -= self._sizes.pop(file_path)
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    # Evicted by another process of a sharded fetch
+                    continue
+                self.evicted += 1
+                EVICTED.inc()
+
+    def report(self):
+        print("LOG: Response cache hits:", self.hits, "revalidated:", self.revalidated,
+              "misses:", self.misses, "pending polls:", self.pending, "evicted:", self.evicted)
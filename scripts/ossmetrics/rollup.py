@@ -0,0 +1,118 @@
+import datetime
+
+# Series derived from the daily snapshots, by the boundary closing each period
+PERIODS = ("weekly", "monthly", "quarterly")
+# Suffix of the daily series, kept in the store only
+DAILY = "daily"
+# First month of each quarter
+QUARTER_MONTHS = (1, 4, 7, 10)
+
+
+def _next_month(day, months=None):
+    """
+    First day of the next month after day, or of the next one among months
+    """
+    year, month = day.year, day.month
+    while True:
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+        if months is None or month in months:
+            return datetime.date(year, month, 1)
+
+
+def bucket_date(period, day):
+    """
+    The boundary closing the period of day: the Sunday of its week, the
+    first day of the next month or of the next quarter, day itself when
+    it is one
+    """
+    if period == "weekly":
+        # WEEKDAY: 0-Monday, 6-Sunday.
+        return day + datetime.timedelta(days=6 - day.weekday())
+    if period == "monthly":
+        return day if day.day == 1 else _next_month(day)
+    if period == "quarterly":
+        if day.day == 1 and day.month in QUARTER_MONTHS:
+            return day
+        return _next_month(day, QUARTER_MONTHS)
+    raise Exception("Unknown period " + period)
+
+
+def boundaries(period, after, until):
+    """
+    The boundaries of period after the date after, up to until included
+    """
+    dates = []
+    bucket = bucket_date(period, after + datetime.timedelta(days=1))
+    while bucket <= until:
+        dates.append(bucket)
+        bucket = bucket_date(period, bucket + datetime.timedelta(days=1))
+    return dates
+
+
+def _parse(date_str):
+    return datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+def start_run(history, date_str, owners):
+    """
+    The boundaries of every period the run of date_str closes, {period: [date_str]}
+
+    Those passed since the last run, so the periods of the days the job did
+    not run are closed too. A run of the same day again closes the same
+    ones. Before the first run, a period is closed up to the latest
+    snapshot of the series of owners, or up to the day before.
+    """
+    date = _parse(date_str)
+    closing = {}
+    for period in PERIODS:
+        state = history.rollup_state(period)
+        if state is None:
+            latest = [history.latest_date(owner + "_" + period) for owner in owners]
+            latest = [day for day in latest if day]
+            if latest:
+                closed_through = max(latest)
+            else:
+                closed_through = (date - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+            state = (closed_through, closed_through, None)
+        closed_through, opened_after, run_date = state
+        if run_date != date_str:
+            # Not run yet today, today closes what came after the last run
+            opened_after = closed_through
+            if closed_through > date_str:
+                # A day before the last one run again, e.g. rebuilt
+                opened_after = date_str
+        dates = [day.strftime("%Y-%m-%d") for day in boundaries(period, _parse(opened_after), date)]
+        closed_through = max([closed_through] + dates)
+        history.set_rollup_state(period, closed_through, opened_after, date_str)
+        closing[period] = dates
+        if dates:
+            print("LOG: Closing the", period, "periods of", ", ".join(dates))
+    return closing
+
+
+def closed_today(history, date_str):
+    """
+    The boundaries closed by the run of date_str, {period: [date_str]}
+    """
+    closing = {}
+    for period in PERIODS:
+        state = history.rollup_state(period)
+        if state is None or state[2] != date_str:
+            closing[period] = []
+            continue
+        closed_through, opened_after, _ = state
+        closing[period] = [day.strftime("%Y-%m-%d")
+                           for day in boundaries(period, _parse(opened_after), _parse(date_str))]
+    return closing
+
+
+def oldest_closed(history):
+    """
+    The earliest date every period is closed through, None before the first run
+    """
+    states = [history.rollup_state(period) for period in PERIODS]
+    if None in states:
+        return None
+    return min(state[0] for state in states)
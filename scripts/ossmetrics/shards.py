@@ -0,0 +1,89 @@
+import concurrent.futures
+import copy
+import os
+import shutil
+
+from . import archive
+from . import fetch as fetch_stage
+from . import instrument
+
+
+def fetch_shard(config, plan, shard):
+    """
+    Fetch one shard of the plan in a worker process
+    Returns the fetched data, the requests sent and the metrics of the process
+    """
+    # Only what this process measures goes back to the parent
+    instrument.REGISTRY.reset()
+    config = copy.copy(config)
+    config.shard = shard
+    client = fetch_stage.create_client(config)
+    fetched = fetch_stage.fetch(config, plan, client)
+    return fetched, client.request_count, instrument.REGISTRY.to_dict()
+
+
+def merge(plan, results):
+    """
+    The fetched data of the whole plan from that of its shards, the same
+    as a fetch of the plan in one process: the spool files sort in plan
+    order and the members count is the one of the last organization with one
+    """
+    sources = []
+    stats = {}
+    org_members = {}
+    order = {}
+    for fetched in results:
+        sources.extend(fetched["sources"])
+        for repo, summary in fetched["stats"].items():
+            stats.setdefault(repo, summary)
+        org_members.update(fetched["org_members"])
+        order.update(fetched.get("order", {}))
+    members = None
+    for org in plan.orgs:
+        if org_members.get(org):
+            members = org_members[org]
+    merged = {
+        "members": members,
+        "org_members": org_members,
+        "sources": sorted(sources),
+        "stats": stats,
+    }
+    if "order" in results[0]:
+        merged["order"] = order
+    return merged
+
+
+def fetch(config, plan):
+    """
+    Fetch the plan with config.processes worker processes
+
+    The organizations and batches of individual repositories are dealt to
+    the processes in turn, in the order of the plan. Each process fetches
+    and normalizes its shard into the shared spool, with its own checkpoint
+    and archive manifest, and the results are merged in the order of the
+    plan, so the repositories and the outputs are the same as with one
+    process. Returns the same data as fetch.fetch, and the requests sent.
+    """
+    count = config.processes
+    print("LOG: Fetching in", count, "processes")
+    if not config.resume and os.path.exists(config.spool_dir):
+        shutil.rmtree(config.spool_dir)
+    if not os.path.exists(config.spool_dir):
+        os.makedirs(config.spool_dir)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(fetch_shard, config, plan, (index, count)) for index in range(count)]
+        results = [future.result() for future in futures]
+
+    requests = 0
+    for _, shard_requests, metrics in results:
+        requests += shard_requests
+        instrument.REGISTRY.merge(metrics)
+    fetched = merge(plan, [result[0] for result in results])
+
+    if config.archive_dir:
+        archive.merge_shards(archive.ResponseArchive(config.archive_dir), config.date_str,
+                             archive.run_key(plan.key(config.date_str), config.node_shard), count,
+                             fetched["sources"], fetched["members"])
+    print("LOG: Merged the", count, "shards:", len(fetched["sources"]), "spool files")
+    return fetched, requests
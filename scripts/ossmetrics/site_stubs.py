@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+
+
+def render_stub(layout, permalink, title, options={}):
+    """
+    Front matter of a Jekyll page
+    """
+    lines = ["---"]
+    lines.append("layout: '{0}'".format(layout))
+    lines.append("permalink: '{0}'".format(permalink))
+    lines.append("title: '{0}'".format(title))
+    for keyField in options:
+        lines.append(str(keyField) + ": '" + options[keyField] + "'")
+    lines.append("---")
+    return "\n".join(lines) + "\n"
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class StubWriter(object):
+    """
+    Write the Jekyll stubs of the metrics pages, only when they changed
+
+    The hash of every generated file is kept in a manifest next to the
+    pages, so unchanged files are neither rewritten nor re-read, and their
+    mtime is left alone for Jekyll's incremental build. The manifest tells
+    apart the pages written by this writer, "generated", from those found
+    in the directory before it existed, "found". Only the generated pages
+    of repositories no longer tracked may be pruned; the found ones, e.g.
+    older reports, are never deleted. The writes and deletions are staged
+    in output.
+    """
+
+    def __init__(self, root, output, manifest_name=".stubs-manifest.json"):
+        self.root = root
+        self.output = output
+        self.manifest_path = os.path.join(root, manifest_name)
+        self.written = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.kept = 0
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if "generated" in manifest:
+                self.generated = manifest["generated"]
+                self.found = manifest["found"]
+            else:
+                # Written by an older version, which listed the found pages as generated
+                self.generated = {}
+                self.found = manifest
+        else:
+            self.generated = {}
+            self.found = self._scan()
+
+    def _scan(self):
+        """
+        Hashes of the pages already in the directory before the manifest existed
+        """
+        manifest = {}
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".md"):
+                    file_path = os.path.join(directory, name)
+                    with open(file_path) as f:
+                        manifest[os.path.relpath(file_path, self.root)] = content_hash(f.read())
+        return manifest
+
+    def write(self, file_path, layout, permalink, title, options={}):
+        content = render_stub(layout, permalink, title, options)
+        digest = content_hash(content)
+        relative_path = os.path.relpath(file_path, self.root)
+        known = self.generated.get(relative_path, self.found.get(relative_path))
+        if known == digest and self.output.exists(file_path):
+            self.skipped += 1
+            return
+
+        self.output.write(file_path, content, "page")
+        self.found.pop(relative_path, None)
+        self.generated[relative_path] = digest
+        self.written += 1
+
+    def pages(self):
+        """
+        Paths of all the known pages, relative to the root
+        """
+        return sorted(set(self.generated) | set(self.found))
+
+    def prune(self, tracked_repos, delete=False):
+        """
+        Delete the generated pages of the organizations and repositories
+        that are not in tracked_repos (a collection of 'owner/name'), only
+        counted as kept unless delete is True
+        """
+        tracked_orgs = set(repo.split("/")[0] for repo in tracked_repos)
+        tracked_repos = set(tracked_repos)
+        for relative_path in sorted(self.generated):
+            parts = relative_path.split(os.sep)
+            org = parts[0]
+            if len(parts) > 2:
+                keep = org + "/" + parts[1] in tracked_repos
+            else:
+                keep = org in tracked_orgs
+            if keep:
+                continue
+            if not delete:
+                self.kept += 1
+                continue
+
+            file_path = os.path.join(self.root, relative_path)
+            if self.output.exists(file_path):
+                # With the directories left empty
+                self.output.remove(file_path, self.root)
+                self.deleted += 1
+            del self.generated[relative_path]
+
+    def save(self):
+        self.output.write_json(self.manifest_path, {"generated": self.generated, "found": self.found}, "manifest")
+
+    def report(self):
+        print("LOG: Metrics pages written:", self.written, "unchanged:", self.skipped, "deleted:", self.deleted)
+        if self.kept:
+            print("LOG: Metrics pages of untracked repositories kept:", self.kept, "--prune-pages deletes them")
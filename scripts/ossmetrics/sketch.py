@@ -0,0 +1,95 @@
+import base64
+import hashlib
+import math
+
+# Registers of the HyperLogLog are indexed by the first PRECISION bits of
+# a hash, 4096 of them give a standard error of about 1.6%
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+HASH_BITS = 64
+# Above this many hashes the exact set would be larger than the registers
+EXACT_LIMIT = 256
+
+
+def hash_key(key):
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:HASH_BITS // 4], 16)
+
+
+class UniqueSketch(object):
+    """
+    Mergeable count of unique keys, e.g. the authors of a repository
+
+    Up to EXACT_LIMIT keys the sketch is the exact set of their 64 bit
+    hashes, above it a HyperLogLog. Merging the sketches of several
+    repositories counts the authors of all of them once each: exactly
+    while the union stays small, within about 1.6% once it is a
+    HyperLogLog. Only hashes are kept, not the keys.
+
+    encode() gives a short string for the snapshots, "e" followed by the
+    sorted hashes in hexadecimal or "h" followed by the registers in
+    base64, the same for the same keys.
+    """
+
+    def __init__(self, keys=()):
+        self.hashes = set()
+        self.registers = None
+        for key in keys:
+            self.add_hash(hash_key(key))
+
+    @classmethod
+    def decode(cls, encoded):
+        sketch = cls()
+        if encoded.startswith("h"):
+            sketch.registers = bytearray(base64.b64decode(encoded[1:]))
+        else:
+            sketch.hashes = set(int(encoded[i:i + 16], 16) for i in range(1, len(encoded), 16))
+        return sketch
+
+    def encode(self):
+        if self.registers is not None:
+            return "h" + base64.b64encode(bytes(self.registers)).decode("ascii")
+        return "e" + "".join("{0:016x}".format(value) for value in sorted(self.hashes))
+
+    def _to_registers(self):
+        self.registers = bytearray(REGISTERS)
+        hashes, self.hashes = self.hashes, set()
+        for value in hashes:
+            self.add_hash(value)
+
+    def add_hash(self, value):
+        if self.registers is None:
+            self.hashes.add(value)
+            if len(self.hashes) > EXACT_LIMIT:
+                self._to_registers()
+            return
+        index = value >> (HASH_BITS - PRECISION)
+        rest = value & ((1 << (HASH_BITS - PRECISION)) - 1)
+        rank = HASH_BITS - PRECISION - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """
+        Add the keys of other to this sketch
+        """
+        if other.registers is None:
+            for value in other.hashes:
+                self.add_hash(value)
+            return
+        if self.registers is None:
+            self._to_registers()
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        """
+        Number of unique keys, estimated once the sketch is a HyperLogLog
+        """
+        if self.registers is None:
+            return len(self.hashes)
+        alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+        estimate = alpha * REGISTERS * REGISTERS / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Few keys for the registers, linear counting is closer
+            estimate = REGISTERS * math.log(float(REGISTERS) / zeros)
+        return int(round(estimate))
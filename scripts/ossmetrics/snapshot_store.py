@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+
+from .records import SNAPSHOT_FIELDS
+
+# Seconds to wait for another process writing to the database
+LOCK_TIMEOUT = 60
+
+
+class SnapshotStore(object):
+    """
+    Last fetched snapshot of every repository, with the fingerprint and
+    the date it was fetched, so unchanged repositories are not fetched again,
+    and the digest of its raw node in the response archive
+
+    The commit authors of the default branch of every repository are kept
+    too, with the HEAD they were counted at, see contributors.py.
+
+    The fetching threads share the store, every access holds a lock. The
+    processes of a sharded fetch share its database, waiting on each other.
+    """
+
+    def __init__(self, db_path):
+        if os.path.dirname(db_path) and not os.path.exists(os.path.dirname(db_path)):
+            os.makedirs(os.path.dirname(db_path))
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, timeout=LOCK_TIMEOUT)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "name TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, fetched TEXT NOT NULL, row TEXT NOT NULL, "
+            "node TEXT)")
+        try:
+            # Stores created before the archive
+            self.connection.execute("ALTER TABLE snapshots ADD COLUMN node TEXT")
+        except sqlite3.OperationalError:
+            pass
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS authors (name TEXT PRIMARY KEY, head TEXT NOT NULL, authors TEXT NOT NULL)")
+        self.connection.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, names):
+        """
+        Returns {name: (fingerprint, date fetched, row, node digest)} of the names known
+        """
+        found = {}
+        with self._lock:
+            for name in names:
+                row = self.connection.execute(
+                    "SELECT fingerprint, fetched, row, node FROM snapshots WHERE name = ?", (name,)).fetchone()
+                if not row:
+                    continue
+                snapshot_row = json.loads(row[2])
+                # A row of another layout of the snapshots is fetched again
+                if len(snapshot_row) == len(SNAPSHOT_FIELDS):
+                    found[name] = (json.loads(row[0]), row[1], snapshot_row, row[3])
+        return found
+
+    def put_many(self, snapshots):
+        """
+        snapshots is a list of (name, fingerprint, date fetched, row, node digest)
+        """
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO snapshots (name, fingerprint, fetched, row, node) VALUES (?, ?, ?, ?, ?)",
+                [(name, json.dumps(fingerprint), fetched, json.dumps(row), node)
+                 for name, fingerprint, fetched, row, node in snapshots])
+            self.connection.commit()
+
+    def get_authors(self, names):
+        """
+        Returns {name: (HEAD oid, [author])} of the names known
+        """
+        found = {}
+        with self._lock:
+            for name in names:
+                row = self.connection.execute(
+                    "SELECT head, authors FROM authors WHERE name = ?", (name,)).fetchone()
+                if row:
+                    found[name] = (row[0], json.loads(row[1]))
+        return found
+
+    def put_authors(self, authors):
+        """
+        authors is a list of (name, HEAD oid, [author])
+        """
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO authors (name, head, authors) VALUES (?, ?, ?)",
+                [(name, head, json.dumps(names)) for name, head, names in authors])
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,92 @@
+import json
+import os
+import queue
+import shutil
+import threading
+
+from . import instrument
+
+# Pages waiting to be written before the fetching threads are held back
+MAX_QUEUED_PAGES = 16
+
+
+def source_file(index, name):
+    """
+    Spool file of a source, numbered so the sources sort in plan order
+    """
+    return "{0:04d}-{1}.jsonl".format(index, name.replace("/", "_"))
+
+
+class SpoolWriter(object):
+    """
+    Append pages of records to one JSON lines file per source
+
+    The pages are queued by the fetching threads and written by a single
+    writer thread, so the disk writes overlap with the requests and at
+    most max_pages pages are held in memory. Pages of the same source are
+    written in the order they were queued.
+
+    When resuming, the files of the last run are kept, and a source written
+    again replaces its file from the first page queued by this run.
+    """
+
+    def __init__(self, directory, max_pages=MAX_QUEUED_PAGES, resume=False):
+        self.directory = directory
+        if os.path.exists(directory) and not resume:
+            shutil.rmtree(directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.queue = queue.Queue(maxsize=max_pages)
+        self.error = None
+        self._written = set()
+        self._thread = threading.Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, source, records, done=None):
+        """
+        Queue a page of records, done() is called once they are written
+        """
+        self.queue.put((source, records, done))
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            source, records, done = item
+            try:
+                # Opened for each page, there can be more sources than file descriptors
+                with open(os.path.join(self.directory, source), "a" if source in self._written else "w") as f:
+                    for record in records:
+                        f.write(json.dumps(record))
+                        f.write("\n")
+                    instrument.file_written("spool", f.tell())
+                self._written.add(source)
+                if done is not None:
+                    done()
+            except Exception as e:
+                # Keep draining the queue so the fetching threads are not blocked
+                self.error = e
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def read_spool(directory, sources):
+    """
+    Records of the sources in the given order, one at a time
+    """
+    for source in sources:
+        file_path = os.path.join(directory, source)
+        if not os.path.exists(file_path):
+            continue
+        instrument.FILES_READ.inc(kind="spool")
+        with open(file_path) as f:
+            for line in f:
+                yield json.loads(line)
@@ -0,0 +1,60 @@
+import json
+import resource
+import sys
+import time
+
+from . import instrument
+
+STAGE_SECONDS = instrument.gauge("stage_seconds", "Wall time of each stage", ("stage",))
+STAGE_REQUESTS = instrument.gauge("stage_requests", "Requests sent to GitHub by each stage", ("stage",))
+PEAK_RSS = instrument.gauge("peak_rss_kb", "Peak resident memory at the end of each stage", ("stage",))
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of the process in kilobytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+
+class StageRecorder(object):
+    """
+    Record the wall time, requests and peak memory of each stage of a run
+
+    mark(name) ends the running stage and starts the next one. The
+    records are only written when a report path is given, e.g. by the
+    benchmark harness through FETCH_STAGE_REPORT.
+    """
+
+    def __init__(self, report_path=None, request_count=lambda: 0):
+        self.report_path = report_path
+        self.request_count = request_count
+        self.stages = []
+        self._current = None
+
+    def _close(self):
+        if self._current is None:
+            return
+        self._current["end"] = time.time()
+        self._current["seconds"] = round(self._current["end"] - self._current["start"], 4)
+        self._current["requests"] = self.request_count() - self._current.pop("requests_before")
+        self._current["peak_rss_kb"] = peak_rss_kb()
+        STAGE_SECONDS.set(self._current["seconds"], stage=self._current["name"])
+        STAGE_REQUESTS.set(self._current["requests"], stage=self._current["name"])
+        PEAK_RSS.set(self._current["peak_rss_kb"], stage=self._current["name"])
+        self.stages.append(self._current)
+        self._current = None
+
+    def mark(self, name):
+        self._close()
+        self._current = {"name": name, "start": time.time(), "requests_before": self.request_count()}
+
+    def finish(self):
+        self._close()
+        if self.report_path:
+            with open(self.report_path, "w+") as f:
+                json.dump({"stages": self.stages}, f, indent=2)
@@ -0,0 +1,147 @@
+import time
+
+from . import instrument
+from .sketch import UniqueSketch
+
+# GitHub computes the /stats endpoints in background jobs and answers 202
+# until they are ready. Every endpoint listed here is started for every
+# repository and then polled together until ready or until the deadline.
+# The contributors are counted from the commit authors instead, see
+# contributors.py, /stats/contributors is only read from the runs archived
+# before.
+STATS_ENDPOINTS = ("commit_activity", "code_frequency", "participation")
+
+JOBS = instrument.counter("stats_jobs_total", "Statistics jobs by how they ended", ("endpoint", "outcome"))
+POLLS = instrument.counter("stats_polls_total", "Requests to the statistics still being computed")
+
+
+class StatsPoller(object):
+    """
+    Collect the GitHub /stats endpoints of many repositories
+
+    fetch_stats(repo, endpoint) must return (status_code, payload).
+    All the jobs are started first, so the server side computations
+    overlap, then the pending ones are polled with exponential backoff.
+    reduce(endpoint, payload), if given, replaces every payload as soon
+    as it arrives, so the raw payloads are not all kept until the end.
+    on_result(repo, endpoint, payload), if given, is called with every
+    finished job, e.g. to checkpoint it.
+    """
+
+    def __init__(self, fetch_stats, executor, endpoints=STATS_ENDPOINTS,
+                 deadline=120, initial_delay=1, max_delay=30, reduce=None, on_result=None):
+        self.fetch_stats = fetch_stats
+        self.reduce = reduce
+        self.on_result = on_result
+        self.executor = executor
+        self.endpoints = endpoints
+        self.deadline = deadline
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    def _request_all(self, jobs, results):
+        """
+        Request every job once, store the finished ones in results
+        Returns the jobs still being computed by GitHub
+        """
+        pending = []
+        responses = self.executor.map(lambda job: self.fetch_stats(*job), jobs)
+        for job, (status_code, payload) in zip(jobs, responses):
+            if status_code == 202:
+                pending.append(job)
+            else:
+                repo, endpoint = job
+                JOBS.inc(endpoint=endpoint, outcome="ready" if status_code == 200 else "unavailable")
+                payload = payload if status_code == 200 else None
+                if self.reduce is not None:
+                    payload = self.reduce(endpoint, payload)
+                results[repo][endpoint] = payload
+                if self.on_result is not None:
+                    self.on_result(repo, endpoint, payload)
+        return pending
+
+    def collect(self, repos, done=None):
+        """
+        Returns {repo: {endpoint: payload}}, payload is None when the
+        statistics are not available before the deadline
+        The jobs of done, {repo: {endpoint: payload}}, are not requested again
+        """
+        done = done or {}
+        results = {}
+        for repo in repos:
+            results[repo] = dict.fromkeys(self.endpoints)
+            results[repo].update(done.get(repo, {}))
+        jobs = [(repo, endpoint) for repo in repos for endpoint in self.endpoints
+                if endpoint not in done.get(repo, {})]
+
+        started = time.monotonic()
+        pending = self._request_all(jobs, results)
+        print("LOG: Started", len(jobs), "stats jobs,", len(pending), "being computed")
+
+        delay = self.initial_delay
+        while pending:
+            remaining = self.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            POLLS.inc(len(pending))
+            pending = self._request_all(pending, results)
+            print("LOG: Stats jobs still being computed:", len(pending))
+            delay = min(delay * 2, self.max_delay)
+
+        if pending:
+            print("LOG: Stats deadline reached,", len(pending), "jobs left unavailable")
+            for _, endpoint in pending:
+                JOBS.inc(endpoint=endpoint, outcome="deadline")
+        return results
+
+
+SUMMARY_FIELDS = ("contributors", "commits_last_year", "additions", "deletions",
+                  "participation_all", "participation_owner")
+# Encoded UniqueSketch of the contributors, kept out of projects.json
+SKETCH_FIELD = "contributor_sketch"
+
+
+def summarize_endpoint(endpoint, payload):
+    """
+    Reduce the raw payload of one /stats endpoint, or the commit authors of
+    the "authors" pseudo endpoint, to the metrics we publish
+    """
+    summary = {}
+    if endpoint == "authors":
+        if payload is not None:
+            summary["contributors"] = len(payload)
+            summary[SKETCH_FIELD] = UniqueSketch(payload).encode()
+
+    elif endpoint == "contributors":
+        if payload and isinstance(payload[0], dict):
+            summary["contributors"] = len(payload)
+            summary[SKETCH_FIELD] = UniqueSketch(
+                entry["author"]["login"] for entry in payload if entry.get("author")).encode()
+
+    elif endpoint == "commit_activity":
+        if payload:
+            summary["commits_last_year"] = sum(week["total"] for week in payload)
+
+    elif endpoint == "code_frequency":
+        if payload:
+            summary["additions"] = sum(week[1] for week in payload)
+            summary["deletions"] = -sum(week[2] for week in payload)
+
+    elif endpoint == "participation":
+        if payload:
+            summary["participation_all"] = sum(payload.get("all", []))
+            summary["participation_owner"] = sum(payload.get("owner", []))
+
+    return summary
+
+
+def merge_summaries(summaries):
+    """
+    Metrics of one repository from the summaries of its endpoints, None
+    standing for the endpoints that were not available
+    """
+    summary = dict.fromkeys(SUMMARY_FIELDS, 0)
+    for partial in summaries:
+        summary.update(partial or {})
+    return summary
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from . import instrument
+from . import output as output_writer
+
+# Version of the format of the rows, in the user_version of the database
+SCHEMA_VERSION = 2
+
+
+def _content_hash(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+class TimeSeriesStore(object):
+    """
+    Append-only store of the daily snapshots and of the weekly, monthly
+    and quarterly series rolled up from them
+
+    Every series (e.g. DAI-Lab__SDGym_weekly) is a set of (date, payload)
+    rows indexed by (series, date), and its latest date is kept apart so
+    both appending and looking it up cost the same whatever the history.
+
+    The JSON files of the Jekyll data directory stay the published format:
+    a series missing from the store is imported from its JSON file, and
+    only the series appended during the run are exported back, staged in
+    output. The size, mtime and content hash of every exported file are
+    kept, and a file edited since, even to the same size, is imported
+    again. The daily series are kept in the store only. The payloads are
+    stored as compact JSON with sorted keys, so an exported file is the
+    same bytes for the same snapshots.
+    """
+
+    def __init__(self, db_path, data_dir, output):
+        self.data_dir = data_dir
+        self.output = output
+        if os.path.dirname(db_path) and not os.path.exists(os.path.dirname(db_path)):
+            os.makedirs(os.path.dirname(db_path))
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "series TEXT NOT NULL, date TEXT NOT NULL, payload TEXT NOT NULL, "
+            "PRIMARY KEY (series, date)) WITHOUT ROWID")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS series ("
+            "name TEXT PRIMARY KEY, latest TEXT, exported_size INTEGER, exported_mtime REAL, exported_hash TEXT)")
+        # Up to which boundary each period is closed, and what the last run closed
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            "period TEXT PRIMARY KEY, closed_through TEXT, opened_after TEXT, run_date TEXT)")
+        self._migrate()
+        self.connection.commit()
+
+        self._latest = {}
+        # Series -> (size, mtime, content hash) of its JSON file when last imported or exported
+        self._exported = {}
+        for name, latest, size, mtime, content_hash in self.connection.execute(
+                "SELECT name, latest, exported_size, exported_mtime, exported_hash FROM series"):
+            self._latest[name] = latest
+            self._exported[name] = (size, mtime, content_hash)
+        self.dirty = set()
+
+    def _migrate(self):
+        """
+        Bring a store written by an older version to the current format:
+        the payloads in compact JSON (1), the mtime and content hash of the
+        exported files (2)
+        """
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 1:
+            rows = self.connection.execute("SELECT series, date, payload FROM snapshots").fetchall()
+            self.connection.executemany(
+                "UPDATE snapshots SET payload = ? WHERE series = ? AND date = ?",
+                [(output_writer.dumps(json.loads(payload)), series, date) for series, date, payload in rows])
+            if rows:
+                print("LOG: History store migrated:", len(rows), "snapshots")
+        if version < 2:
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(series)")]
+            # The files of these series are compared by content, once, on the next run
+            for column, kind in (("exported_mtime", "REAL"), ("exported_hash", "TEXT")):
+                if column not in columns:
+                    self.connection.execute("ALTER TABLE series ADD COLUMN {0} {1}".format(column, kind))
+        self.connection.execute("PRAGMA user_version = {0}".format(SCHEMA_VERSION))
+
+    def _json_path(self, series):
+        return os.path.join(self.data_dir, series + ".json")
+
+    def _import_json(self, series, file_path, content):
+        """
+        Replace the rows of a series with the content of its JSON file, as bytes
+        """
+        data_metrics = json.loads(content.decode("utf-8"))
+        instrument.FILES_READ.inc(kind="history")
+        self.connection.execute("DELETE FROM snapshots WHERE series = ?", (series,))
+        self.connection.executemany(
+            "INSERT INTO snapshots (series, date, payload) VALUES (?, ?, ?)",
+            [(series, date, output_writer.dumps(payload)) for date, payload in data_metrics.items()])
+        latest = max(data_metrics) if data_metrics else None
+        stat = os.stat(file_path)
+        self._save_series(series, latest, (stat.st_size, stat.st_mtime, _content_hash(content)))
+
+    def _save_series(self, series, latest, exported):
+        """
+        exported is the (size, mtime, content hash) of the JSON file of the series, or None
+        """
+        size, mtime, content_hash = exported or (None, None, None)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO series (name, latest, exported_size, exported_mtime, exported_hash) "
+            "VALUES (?, ?, ?, ?, ?)", (series, latest, size, mtime, content_hash))
+        self._latest[series] = latest
+        self._exported[series] = exported
+
+    def _sync(self, series):
+        """
+        Import the JSON file of a series when the store does not match it
+        """
+        file_path = self.output.path(self._json_path(series))
+        if series in self.dirty or not os.path.exists(file_path):
+            return
+        stat = os.stat(file_path)
+        size, mtime, content_hash = self._exported.get(series) or (None, None, None)
+        if size == stat.st_size and mtime == stat.st_mtime:
+            return
+        with open(file_path, "rb") as f:
+            content = f.read()
+        if content_hash == _content_hash(content):
+            # Touched, e.g. by a checkout, but the same content
+            self._save_series(series, self._latest.get(series), (stat.st_size, stat.st_mtime, content_hash))
+            return
+        self._import_json(series, file_path, content)
+
+    def latest_date(self, series):
+        """
+        Returns the most recent date of a series, None if it is empty
+        """
+        self._sync(series)
+        return self._latest.get(series)
+
+    def date_before(self, series, date):
+        """
+        Returns the most recent date of a series before date, None if there is none
+        """
+        self._sync(series)
+        row = self.connection.execute(
+            "SELECT MAX(date) FROM snapshots WHERE series = ? AND date < ?", (series, date)).fetchone()
+        return row[0]
+
+    def value_at(self, series, date):
+        """
+        Returns the most recent snapshot of a series on or before date, None if there is none
+        """
+        self._sync(series)
+        row = self.connection.execute(
+            "SELECT payload FROM snapshots WHERE series = ? AND date <= ? ORDER BY date DESC LIMIT 1",
+            (series, date)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, series, date):
+        """
+        Returns the snapshot of a date, None if it was not recorded
+        """
+        self._sync(series)
+        row = self.connection.execute(
+            "SELECT payload FROM snapshots WHERE series = ? AND date = ?", (series, date)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def append(self, series, date, payload, export=True):
+        """
+        Add the snapshot of a date, replacing the one already recorded that day
+        The series is exported at the end of the run unless export is False
+        """
+        self._sync(series)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO snapshots (series, date, payload) VALUES (?, ?, ?)",
+            (series, date, output_writer.dumps(payload)))
+        latest = self._latest.get(series)
+        if latest is None or date > latest:
+            latest = date
+        self._save_series(series, latest, self._exported.get(series))
+        if export:
+            self.dirty.add(series)
+
+    def prune(self, suffix, before):
+        """
+        Delete the snapshots of the series ending with suffix older than
+        before, except the most recent of them
+        """
+        pattern = "%" + suffix.replace("_", "\\_")
+        cursor = self.connection.execute(
+            "DELETE FROM snapshots WHERE series LIKE ? ESCAPE '\\' AND date < ("
+            "SELECT MAX(kept.date) FROM snapshots AS kept "
+            "WHERE kept.series = snapshots.series AND kept.date <= ?)", (pattern, before))
+        return cursor.rowcount
+
+    def rollup_state(self, period):
+        """
+        Returns (closed through, opened after, run date) of a period, None before its first run
+        """
+        return self.connection.execute(
+            "SELECT closed_through, opened_after, run_date FROM rollups WHERE period = ?", (period,)).fetchone()
+
+    def set_rollup_state(self, period, closed_through, opened_after, run_date):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO rollups (period, closed_through, opened_after, run_date) VALUES (?, ?, ?, ?)",
+            (period, closed_through, opened_after, run_date))
+
+    def export_json(self, series):
+        """
+        Stage the Jekyll data file of a series, formatted like output.dumps
+        """
+        rows = self.connection.execute(
+            "SELECT date, payload FROM snapshots WHERE series = ? ORDER BY date", (series,))
+        content = "{" + ",".join(json.dumps(date) + ":" + payload for date, payload in rows) + "}"
+        file_path = self._json_path(series)
+        size = self.output.write(file_path, content, "history")
+        # A staged file keeps its mtime when moved into place
+        mtime = os.stat(self.output.path(file_path)).st_mtime
+        self._save_series(series, self._latest.get(series), (size, mtime, _content_hash(content.encode("utf-8"))))
+
+    def export_dirty(self):
+        """
+        Export the series appended since the store was opened
+        Returns the number of files written
+        """
+        for series in sorted(self.dirty):
+            self.export_json(series)
+        count = len(self.dirty)
+        self.dirty = set()
+        return count
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        """
+        Close the store, dropping what was not committed
+        """
+        self.connection.rollback()
+        self.connection.close()
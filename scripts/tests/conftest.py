@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The package is run from scripts/, as by fetch_projects.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
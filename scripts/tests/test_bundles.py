@@ -0,0 +1,34 @@
+import pytest
+
+from ossmetrics import bundles
+
+NAMES = ["org-{0}/repo-{1}".format(org, repo) for org in range(10) for repo in range(100)]
+
+
+def test_assignment_is_stable():
+    first = bundles.HashRing(4)
+    second = bundles.HashRing(4)
+    assert [first.shard_of(name) for name in NAMES] == [second.shard_of(name) for name in NAMES]
+    assert set(first.shard_of(name) for name in NAMES) == set(range(4))
+
+
+def test_every_name_has_one_owner():
+    ring = bundles.HashRing(3)
+    for name in NAMES:
+        assert [ring.owns(shard)(name) for shard in range(3)].count(True) == 1
+
+
+def test_adding_a_shard_moves_a_share():
+    before = bundles.HashRing(4)
+    after = bundles.HashRing(5)
+    moved = [name for name in NAMES if before.shard_of(name) != after.shard_of(name)]
+    # About a fifth of the names go to the new shard, and only there
+    assert len(moved) < len(NAMES) * 0.35
+    assert all(after.shard_of(name) == 4 for name in moved)
+
+
+def test_parse_shard():
+    assert bundles.parse_shard("1/4") == (1, 4)
+    for value in ("4/4", "-1/2", "1", "a/b"):
+        with pytest.raises(Exception):
+            bundles.parse_shard(value)
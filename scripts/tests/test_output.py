@@ -0,0 +1,75 @@
+import json
+import os
+
+from ossmetrics.output import JOURNAL_FILE, OutputTransaction
+
+
+def read(file_path):
+    with open(file_path) as f:
+        return f.read()
+
+
+def site(tmp_path):
+    data_dir = tmp_path / "_data"
+    data_dir.mkdir()
+    (data_dir / "kept.json").write_text("old")
+    (data_dir / "removed.json").write_text("old")
+    return str(data_dir), str(tmp_path / "staging")
+
+
+def test_commit_moves_the_staged_files(tmp_path):
+    data_dir, staging_dir = site(tmp_path)
+    output = OutputTransaction(staging_dir)
+    output.write(os.path.join(data_dir, "kept.json"), "new", "data")
+    output.write(os.path.join(data_dir, "added.json"), "new", "data")
+    output.remove(os.path.join(data_dir, "removed.json"))
+    assert output.listdir(data_dir) == ["added.json", "kept.json"]
+    assert read(os.path.join(data_dir, "kept.json")) == "old"
+    output.commit()
+    assert sorted(os.listdir(data_dir)) == ["added.json", "kept.json"]
+    assert read(os.path.join(data_dir, "kept.json")) == "new"
+    assert not os.path.exists(staging_dir)
+
+
+def test_abort_leaves_the_outputs_untouched(tmp_path):
+    data_dir, staging_dir = site(tmp_path)
+    output = OutputTransaction(staging_dir)
+    output.write(os.path.join(data_dir, "kept.json"), "new", "data")
+    output.write(os.path.join(data_dir, "added.json"), "new", "data")
+    output.remove(os.path.join(data_dir, "removed.json"))
+    output.abort()
+    assert sorted(os.listdir(data_dir)) == ["kept.json", "removed.json"]
+    assert read(os.path.join(data_dir, "kept.json")) == "old"
+    assert not os.path.exists(staging_dir)
+
+
+def test_staging_of_a_killed_run_is_dropped(tmp_path):
+    data_dir, staging_dir = site(tmp_path)
+    output = OutputTransaction(staging_dir)
+    output.write(os.path.join(data_dir, "kept.json"), "new", "data")
+    # Killed before its commit, the next run starts over
+    OutputTransaction(staging_dir)
+    assert read(os.path.join(data_dir, "kept.json")) == "old"
+    assert not os.path.exists(staging_dir)
+
+
+def test_interrupted_commit_is_rolled_forward(tmp_path):
+    data_dir, staging_dir = site(tmp_path)
+    output = OutputTransaction(staging_dir)
+    kept = os.path.abspath(os.path.join(data_dir, "kept.json"))
+    added = os.path.abspath(os.path.join(data_dir, "added.json"))
+    removed = os.path.abspath(os.path.join(data_dir, "removed.json"))
+    output.write(kept, "new", "data")
+    output.write(added, "new", "data")
+    output.remove(removed)
+    # Killed after writing its journal, with one file moved already
+    journal = {"staged": sorted(output.staged.items()), "removed": sorted(output.removed.items())}
+    with open(os.path.join(staging_dir, JOURNAL_FILE), "w+") as f:
+        json.dump(journal, f)
+    os.replace(output.staged[kept], kept)
+
+    OutputTransaction(staging_dir)
+    assert sorted(os.listdir(data_dir)) == ["added.json", "kept.json"]
+    assert read(kept) == "new"
+    assert read(added) == "new"
+    assert not os.path.exists(staging_dir)
@@ -0,0 +1,75 @@
+import os
+
+from ossmetrics import persist
+from ossmetrics import rollup
+from ossmetrics.output import OutputTransaction
+from ossmetrics.timeseries import TimeSeriesStore
+
+ORG = "org"
+
+
+def run(tmp_path, date_str, commits, fail=False):
+    """
+    A run of the day persisting the snapshot of ORG, which fails after it
+    when fail is True, as Pipeline.run commits or drops it
+    """
+    data_dir = str(tmp_path / "_data")
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    output = OutputTransaction(str(tmp_path / "staging"))
+    history = TimeSeriesStore(str(tmp_path / "history.sqlite"), data_dir, output)
+    try:
+        closing = rollup.start_run(history, date_str, [ORG])
+        persist.record_snapshot(history, ORG, None, date_str, {"commitCount": commits}, closing)
+        history.export_dirty()
+        if fail:
+            raise RuntimeError("Rendering failed")
+        output.commit()
+        history.commit()
+        return closing
+    except RuntimeError:
+        return None
+    finally:
+        output.abort()
+        history.close()
+
+
+def series(tmp_path, period):
+    output = OutputTransaction(str(tmp_path / "staging"))
+    history = TimeSeriesStore(str(tmp_path / "history.sqlite"), str(tmp_path / "_data"), output)
+    try:
+        name = persist.series_name(ORG, period=period)
+        rows = history.connection.execute(
+            "SELECT date FROM snapshots WHERE series = ? ORDER BY date", (name,)).fetchall()
+        return dict((date, history.get(name, date)["commitCount"]) for date, in rows)
+    finally:
+        history.close()
+
+
+def test_failed_run_closes_its_period_on_the_next_run(tmp_path):
+    run(tmp_path, "2020-10-31", 1)
+    # The run of Sunday, closing the week, fails after persisting
+    assert run(tmp_path, "2020-11-01", 2, fail=True) is None
+    assert "2020-11-01" not in series(tmp_path, "weekly")
+    closing = run(tmp_path, "2020-11-02", 3)
+    assert closing["weekly"] == ["2020-11-01"]
+    assert closing["monthly"] == ["2020-11-01"]
+    # The Sunday snapshot was dropped with its run, the Saturday one stands in
+    assert series(tmp_path, "weekly") == {"2020-11-01": 1}
+
+
+def test_missed_days_close_every_period_passed(tmp_path):
+    run(tmp_path, "2020-10-30", 1)
+    closing = run(tmp_path, "2020-11-10", 2)
+    assert closing["weekly"] == ["2020-11-01", "2020-11-08"]
+    assert closing["monthly"] == ["2020-11-01"]
+    assert closing["quarterly"] == []
+    assert series(tmp_path, "weekly") == {"2020-11-01": 1, "2020-11-08": 1}
+
+
+def test_day_run_again_closes_the_same_periods(tmp_path):
+    run(tmp_path, "2020-10-31", 1)
+    first = run(tmp_path, "2020-11-01", 2)
+    again = run(tmp_path, "2020-11-01", 3)
+    assert first == again
+    assert series(tmp_path, "weekly") == {"2020-11-01": 3}
@@ -0,0 +1,40 @@
+from ossmetrics.sketch import EXACT_LIMIT, UniqueSketch
+
+
+def keys(start, stop):
+    return ["author-{0}".format(i) for i in range(start, stop)]
+
+
+def test_exact_below_the_limit():
+    sketch = UniqueSketch(keys(0, EXACT_LIMIT) + keys(0, 10))
+    assert sketch.registers is None
+    assert sketch.count() == EXACT_LIMIT
+
+
+def test_merge_counts_the_union_once():
+    sketch = UniqueSketch(keys(0, 100))
+    sketch.merge(UniqueSketch(keys(50, 150)))
+    assert sketch.count() == 150
+
+
+def test_estimate_of_many_keys():
+    sketch = UniqueSketch(keys(0, 10000))
+    assert sketch.registers is not None
+    assert abs(sketch.count() - 10000) < 500
+
+
+def test_merge_of_large_sketches_is_the_sketch_of_the_union():
+    sketch = UniqueSketch(keys(0, 6000))
+    sketch.merge(UniqueSketch(keys(4000, 10000)))
+    assert sketch.encode() == UniqueSketch(keys(0, 10000)).encode()
+    exact = UniqueSketch(keys(0, 10))
+    exact.merge(UniqueSketch(keys(0, 1000)))
+    assert exact.encode() == UniqueSketch(keys(0, 1000)).encode()
+
+
+def test_encode_round_trip():
+    for sketch in (UniqueSketch(), UniqueSketch(keys(0, 20)), UniqueSketch(keys(0, 1000))):
+        decoded = UniqueSketch.decode(sketch.encode())
+        assert decoded.encode() == sketch.encode()
+        assert decoded.count() == sketch.count()
+    assert UniqueSketch(keys(0, 20)).encode() == UniqueSketch(reversed(keys(0, 20))).encode()